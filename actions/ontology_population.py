@@ -5,13 +5,23 @@ This module handles the recognition of entities in text
 and population of the RDF ontology with those entities.
 """
 
+import io
 import os
 import sys
 import logging
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from itertools import product
+import ahocorasick
+import xxhash
+from pybloom_live import ScalableBloomFilter
 from rdflib import Graph, Literal, Namespace, URIRef, BNode
 from rdflib.namespace import RDF, RDFS, XSD
 import requests
-from SPARQLWrapper import SPARQLWrapper, JSON, POST
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from actions.preprocessing import extract_and_preprocess_hdx_data, extract_humanitarian_concepts
 
 # Configure logging
@@ -24,9 +34,113 @@ DATASET = "humanitarian"
 QUERY_ENDPOINT = f"{FUSEKI_URL}/{DATASET}/query"
 UPDATE_ENDPOINT = f"{FUSEKI_URL}/{DATASET}/update"
 
+# Number of triples sent to the triple store per request
+UPDATE_BATCH_SIZE = 10000
+
+# Below this many sentences entity recognition runs in-process, since
+# starting a process pool costs more than it saves
+PARALLEL_MIN_SENTENCES = 2000
+
+# Shared HTTP session so every request to Fuseki reuses pooled keep-alive
+# connections. Adding triples is idempotent, so POSTs can safely be retried.
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.2, allowed_methods=frozenset({"GET", "POST"}))
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
 # Humanitarian ontology namespace
 HUMANITARIAN = Namespace("http://example.org/humanitarian#")
 
+# Mapping from Rasa entity types to ontology entity types
+RASA_ENTITY_TYPE_MAPPING = {
+    'health_facility': 'health_facility',
+    'water_source': 'water_source',
+    'location': 'location',
+    'service_type': 'service',
+    'request_type': 'need',
+    'person': 'person',
+    'sickness_type': 'sickness',
+    'person_name': 'person'
+}
+
+# Keyword patterns used for fallback entity recognition
+ENTITY_PATTERNS = {
+    "camp": ["camp", "site", "kambi", "settlement"],
+    "health_facility": ["hospital", "clinic", "dispensary", "health center", "health centre", "afya", "hospitali", "kliniki"],
+    "water_source": ["water", "source", "maji", "stream", "well", "borehole", "mayi", "majii", "robinet", "robinets", "kisima"],
+    "location": ["goma", "nyiragongo", "rutshuru", "bulengo", "karisimbi", "masisi", "wapi", "fasi", "kambi"],
+    "organization": ["unhcr", "unicef", "wfp", "who", "msf", "icrc", "ngo", "viongozi"],
+    "service": ["education", "protection", "distribution", "vaccination", "treatment", "assistance", 
+               "tunziwa", "tunza", "tunzaka", "zalisha", "dawa", "ndui", "shoteya", "pokeya", "kamata"],
+    "need": ["food", "shelter", "medicine", "security", "education", "chakula", "msaada", "mayi", "maji",
+            "dawa", "usalama", "hema", "masomo", "kutunziwa", "blanketi", "sabuni", "nafasi", "pesa"],
+    "person": ["watoto", "mtu", "wakimbizi", "watu", "batu", "bakimbizi", "familia", "mtoto"],
+    "sickness_type": ["malaria", "malali", "ukimwi", "homa"]
+}
+
+# Ontology class of each entity type
+ENTITY_RDF_CLASSES = {
+    "camp": "Camp",
+    "health_facility": "HealthFacility",
+    "water_source": "WaterSource",
+    "location": "Location",
+    "organization": "NGO",
+    "service": "HealthService",
+    "need": "Need",
+    "person": "DisplacedPerson",
+    "sickness_type": "HealthNeed",
+    "service_type": "HealthService"
+}
+
+# Relationships created between entities found in the same text, as
+# (subject entity type, predicate, object entity type)
+ENTITY_LINK_RULES = [
+    # Link health facilities to locations
+    ("health_facility", "hasLocation", "location"),
+    # Link camps to locations
+    ("camp", "hasLocation", "location"),
+    # Link organizations to services they provide
+    ("organization", "providesService", "service"),
+    # Link health facilities to the service types they provide
+    ("health_facility", "providesService", "service_type"),
+    # Link health facilities to the sicknesses they treat
+    ("health_facility", "treats", "sickness_type"),
+    # Link persons to camps
+    ("person", "registeredAt", "camp"),
+    # Link persons to their needs
+    ("person", "hasNeed", "need"),
+]
+
+def build_entity_automaton(patterns=ENTITY_PATTERNS):
+    """
+    Build an Aho-Corasick automaton over all entity keywords
+    
+    Args:
+        patterns: Dictionary mapping entity types to keyword lists
+        
+    Returns:
+        Automaton whose values are (keyword, keyword length, entity_types) tuples
+    """
+    # A keyword can belong to several entity types (e.g. "maji")
+    keyword_types = {}
+    for entity_type, keywords in patterns.items():
+        for keyword in keywords:
+            keyword_types.setdefault(keyword, []).append(entity_type)
+    
+    automaton = ahocorasick.Automaton()
+    for keyword, entity_types in keyword_types.items():
+        automaton.add_word(keyword, (keyword, len(keyword), tuple(entity_types)))
+    automaton.make_automaton()
+    
+    return automaton
+
+# Built once at import time and shared by every call to recognize_entities
+_ENTITY_AUTOMATON = build_entity_automaton()
+
 def initialize_graph():
     """Initialize and return a new RDF graph with appropriate namespaces"""
     g = Graph()
@@ -41,21 +155,19 @@ def initialize_graph():
 
 def load_existing_ontology():
     """Load the existing humanitarian ontology from the triple store"""
-    sparql = SPARQLWrapper(QUERY_ENDPOINT)
-    
-    # Query to get all triples
-    query = """
-    CONSTRUCT { ?s ?p ?o }
-    WHERE { ?s ?p ?o }
-    """
-    
-    sparql.setQuery(query)
-    sparql.setReturnFormat(JSON)
+    # Fetch the default graph through the Graph Store Protocol as plain
+    # N-Triples and parse it straight from the response stream
+    url = f"{FUSEKI_URL}/{DATASET}/data?default"
+    headers = {"Accept": "application/n-triples"}
     
     try:
-        results = sparql.query().convert()
-        g = Graph()
-        g.parse(data=results, format="json-ld")
+        with _SESSION.get(url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            
+            g = initialize_graph()
+            g.parse(source=response.raw, format="nt")
+        
         logger.info(f"Loaded {len(g)} triples from the triple store")
         return g
     except Exception as e:
@@ -89,18 +201,7 @@ def recognize_entities(text, entity_model=None, rasa_entities=None):
                 entity_value = ent['value']
                 
                 # Map Rasa entity types to ontology entity types if needed
-                type_mapping = {
-                    'health_facility': 'health_facility',
-                    'water_source': 'water_source',
-                    'location': 'location',
-                    'service_type': 'service',
-                    'request_type': 'need',
-                    'person': 'person',
-                    'sickness_type': 'sickness',
-                    'person_name': 'person'
-                }
-                
-                mapped_type = type_mapping.get(entity_type, entity_type)
+                mapped_type = RASA_ENTITY_TYPE_MAPPING.get(entity_type, entity_type)
                 
                 entities.append({
                     "type": mapped_type,
@@ -114,49 +215,84 @@ def recognize_entities(text, entity_model=None, rasa_entities=None):
             return entities
     
     # Fall back to pattern matching if no Rasa entities or mapping failed
-    logger.info("Falling back to pattern matching for entity recognition")
-    
-    # Map patterns to entity types
-    patterns = {
-        "camp": ["camp", "site", "kambi", "settlement"],
-        "health_facility": ["hospital", "clinic", "dispensary", "health center", "health centre", "afya", "hospitali", "kliniki"],
-        "water_source": ["water", "source", "maji", "stream", "well", "borehole", "mayi", "majii", "robinet", "robinets", "kisima"],
-        "location": ["goma", "nyiragongo", "rutshuru", "bulengo", "karisimbi", "masisi", "wapi", "fasi", "kambi"],
-        "organization": ["unhcr", "unicef", "wfp", "who", "msf", "icrc", "ngo", "viongozi"],
-        "service": ["education", "protection", "distribution", "vaccination", "treatment", "assistance", 
-                   "tunziwa", "tunza", "tunzaka", "zalisha", "dawa", "ndui", "shoteya", "pokeya", "kamata"],
-        "need": ["food", "shelter", "medicine", "security", "education", "chakula", "msaada", "mayi", "maji",
-                "dawa", "usalama", "hema", "masomo", "kutunziwa", "blanketi", "sabuni", "nafasi", "pesa"],
-        "person": ["watoto", "mtu", "wakimbizi", "watu", "batu", "bakimbizi", "familia", "mtoto"],
-        "sickness_type": ["malaria", "malali", "ukimwi", "homa"]
-    }
+    # (logged at debug level since this runs once per sentence during ingestion)
+    logger.debug("Falling back to pattern matching for entity recognition")
     
     text_lower = text.lower()
+    text_length = len(text_lower)
+    
+    # Single pass over the text: the automaton (a keyword trie with failure
+    # links) reports every keyword occurrence together with its entity types
+    matches = []
+    for end_idx, (keyword, keyword_length, entity_types) in _ENTITY_AUTOMATON.iter(text_lower):
+        start = end_idx - keyword_length + 1
+        end = end_idx + 1
+        
+        # Only whole-word matches are kept, so a hit inside a longer word
+        # (e.g. "well" in "dwell" or "maji" in "majii") is skipped
+        if start > 0 and text_lower[start - 1].isalnum():
+            continue
+        if end < text_length and text_lower[end].isalnum():
+            continue
+        
+        matches.append((start, end, keyword, entity_types))
+    
+    # Resolve overlapping matches in favour of the longest keyword (nothing
+    # to resolve for the common case of at most one match)
+    if len(matches) > 1:
+        matches.sort(key=lambda match: match[0] - match[1])
+        taken = bytearray(text_length)
+        accepted = []
+        for match in matches:
+            start, end = match[0], match[1]
+            if taken.find(1, start, end) != -1:
+                continue
+            taken[start:end] = b"\x01" * (end - start)
+            accepted.append(match)
+        accepted.sort()
+    else:
+        accepted = matches
     
-    for entity_type, keywords in patterns.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                # Find the position of the keyword in the text
-                pos = text_lower.find(keyword)
-                
-                # Extract the surrounding context
-                start = max(0, text_lower.rfind(" ", 0, pos) + 1)
-                end = text_lower.find(" ", pos + len(keyword))
-                if end == -1:
-                    end = len(text_lower)
-                
-                # Get the exact entity text from the original text
-                entity_text = text[start:end]
-                
-                entities.append({
-                    "type": entity_type,
-                    "value": entity_text,
-                    "start": start,
-                    "end": end
-                })
+    seen = set()
+    for start, end, keyword, entity_types in accepted:
+        # Get the exact entity text from the original text
+        entity_text = text[start:end]
+        
+        # Only the first occurrence of each keyword is reported per entity type
+        for entity_type in entity_types:
+            if (entity_type, keyword) in seen:
+                continue
+            seen.add((entity_type, keyword))
+            
+            entities.append({
+                "type": entity_type,
+                "value": entity_text,
+                "start": start,
+                "end": end
+            })
     
     return entities
 
+# Characters replaced by underscores in entity URI slugs
+_SLUG_TABLE = str.maketrans({" ": "_", "-": "_"})
+
+@lru_cache(maxsize=8192)
+def _slug(value):
+    """Return the (cached) URI slug for an entity value"""
+    return value.lower().translate(_SLUG_TABLE)
+
+# The same locations, camps and organizations are mentioned across many
+# sentences, so their RDF terms are interned instead of rebuilt per mention
+@lru_cache(maxsize=65536)
+def _entity_uri(ns, entity_type, slug):
+    """Return the (cached) URI for an entity of the given type and slug"""
+    return URIRef(f"{ns}{entity_type}_{slug}")
+
+@lru_cache(maxsize=65536)
+def _literal(value):
+    """Return a (cached) plain literal for the given value"""
+    return Literal(value)
+
 def entity_to_rdf(entity, graph, ns=HUMANITARIAN):
     """
     Convert an entity to RDF triples and add to the graph
@@ -174,39 +310,17 @@ def entity_to_rdf(entity, graph, ns=HUMANITARIAN):
     
     # Create a URI for the entity
     # Use slugified entity value for the URI
-    slug = entity_value.lower().replace(" ", "_").replace("-", "_")
-    uri = URIRef(f"{ns}{entity_type}_{slug}")
-    
-    # Add entity type triple
-    if entity_type == "camp":
-        graph.add((uri, RDF.type, ns.Camp))
-    elif entity_type == "health_facility":
-        graph.add((uri, RDF.type, ns.HealthFacility))
-    elif entity_type == "water_source":
-        graph.add((uri, RDF.type, ns.WaterSource))
-    elif entity_type == "location":
-        graph.add((uri, RDF.type, ns.Location))
-    elif entity_type == "organization":
-        graph.add((uri, RDF.type, ns.NGO))
-    elif entity_type == "service":
-        graph.add((uri, RDF.type, ns.HealthService))
-    elif entity_type == "need":
-        graph.add((uri, RDF.type, ns.Need))
-    elif entity_type == "person":
-        graph.add((uri, RDF.type, ns.DisplacedPerson))
-    elif entity_type == "sickness_type":
-        graph.add((uri, RDF.type, ns.HealthNeed))
-    elif entity_type == "service_type":
-        graph.add((uri, RDF.type, ns.HealthService))
-    else:
-        # Default to a generic entity
-        graph.add((uri, RDF.type, ns.Entity))
+    slug = _slug(entity_value)
+    uri = _entity_uri(ns, entity_type, slug)
     
-    # Add label
-    graph.add((uri, RDFS.label, Literal(entity_value)))
+    # Add entity type triple (defaults to a generic entity)
+    rdf_class = ENTITY_RDF_CLASSES.get(entity_type, "Entity")
+    graph.add((uri, RDF.type, ns[rdf_class]))
     
-    # Add name property
-    graph.add((uri, ns.name, Literal(entity_value)))
+    # Add label and name property
+    label = _literal(entity_value)
+    graph.add((uri, RDFS.label, label))
+    graph.add((uri, ns.name, label))
     
     return uri
 
@@ -222,77 +336,26 @@ def link_entities(entities, graph, ns=HUMANITARIAN):
     Returns:
         Updated graph with entity relationships
     """
-    # Group entities by type
-    entity_by_type = {}
+    # Add each unique entity to the graph once and group the URIs by type
+    uris_by_type = {}
+    seen = set()
     for entity in entities:
-        entity_type = entity["type"]
-        if entity_type not in entity_by_type:
-            entity_by_type[entity_type] = []
-        entity_by_type[entity_type].append(entity)
+        key = (entity["type"], entity["value"])
+        if key in seen:
+            continue
+        seen.add(key)
+        uris_by_type.setdefault(entity["type"], []).append(entity_to_rdf(entity, graph, ns))
     
     # Create relationship triples based on entity types
-    # For example, link health facilities to locations
-    if "health_facility" in entity_by_type and "location" in entity_by_type:
-        for facility in entity_by_type["health_facility"]:
-            facility_uri = entity_to_rdf(facility, graph, ns)
-            
-            for location in entity_by_type["location"]:
-                location_uri = entity_to_rdf(location, graph, ns)
-                graph.add((facility_uri, ns.hasLocation, location_uri))
-    
-    # Link camps to locations
-    if "camp" in entity_by_type and "location" in entity_by_type:
-        for camp in entity_by_type["camp"]:
-            camp_uri = entity_to_rdf(camp, graph, ns)
-            
-            for location in entity_by_type["location"]:
-                location_uri = entity_to_rdf(location, graph, ns)
-                graph.add((camp_uri, ns.hasLocation, location_uri))
-    
-    # Link organizations to services they provide
-    if "organization" in entity_by_type and "service" in entity_by_type:
-        for org in entity_by_type["organization"]:
-            org_uri = entity_to_rdf(org, graph, ns)
-            
-            for service in entity_by_type["service"]:
-                service_uri = entity_to_rdf(service, graph, ns)
-                graph.add((org_uri, ns.providesService, service_uri))
-    
-    # Link service_type entities to health facilities
-    if "service_type" in entity_by_type and "health_facility" in entity_by_type:
-        for service in entity_by_type["service_type"]:
-            service_uri = entity_to_rdf(service, graph, ns)
-            
-            for facility in entity_by_type["health_facility"]:
-                facility_uri = entity_to_rdf(facility, graph, ns)
-                graph.add((facility_uri, ns.providesService, service_uri))
-    
-    # Link sickness_type to health facilities
-    if "sickness_type" in entity_by_type and "health_facility" in entity_by_type:
-        for sickness in entity_by_type["sickness_type"]:
-            sickness_uri = entity_to_rdf(sickness, graph, ns)
-            
-            for facility in entity_by_type["health_facility"]:
-                facility_uri = entity_to_rdf(facility, graph, ns)
-                graph.add((facility_uri, ns.treats, sickness_uri))
-    
-    # Link persons to camps
-    if "person" in entity_by_type and "camp" in entity_by_type:
-        for person in entity_by_type["person"]:
-            person_uri = entity_to_rdf(person, graph, ns)
-            
-            for camp in entity_by_type["camp"]:
-                camp_uri = entity_to_rdf(camp, graph, ns)
-                graph.add((person_uri, ns.registeredAt, camp_uri))
-    
-    # Link need entities to persons
-    if "need" in entity_by_type and "person" in entity_by_type:
-        for need in entity_by_type["need"]:
-            need_uri = entity_to_rdf(need, graph, ns)
-            
-            for person in entity_by_type["person"]:
-                person_uri = entity_to_rdf(person, graph, ns)
-                graph.add((person_uri, ns.hasNeed, need_uri))
+    for subject_type, predicate, object_type in ENTITY_LINK_RULES:
+        subjects = uris_by_type.get(subject_type)
+        objects = uris_by_type.get(object_type)
+        if not subjects or not objects:
+            continue
+        
+        predicate_uri = ns[predicate]
+        for subject_uri, object_uri in product(subjects, objects):
+            graph.add((subject_uri, predicate_uri, object_uri))
     
     return graph
 
@@ -310,15 +373,17 @@ def update_triple_store(graph):
         logger.warning("No triples to add to the triple store")
         return False
     
-    # Serialize the graph to turtle format
-    turtle_data = graph.serialize(format="turtle")
+    # Serialize the graph to N-Triples, which needs no prefix resolution or
+    # pretty-printing, straight into a bytes buffer
+    buffer = io.BytesIO()
+    graph.serialize(destination=buffer, format="nt", encoding="utf-8")
     
     # Use direct HTTP request instead of SPARQLWrapper
     url = f"{FUSEKI_URL}/{DATASET}/data"
-    headers = {"Content-Type": "text/turtle"}
+    headers = {"Content-Type": "application/n-triples; charset=utf-8"}
     
     try:
-        response = requests.post(url, headers=headers, data=turtle_data)
+        response = _SESSION.post(url, headers=headers, data=buffer.getvalue())
         
         if response.status_code == 200 or response.status_code == 201:
             logger.info(f"Added {len(graph)} triples to the triple store")
@@ -330,13 +395,215 @@ def update_triple_store(graph):
         logger.error(f"Error connecting to triple store: {e}")
         return False
 
-def process_hdx_data_for_ontology(excel_file_path, sheet_name=None):
+def nt_triple(s, p, o):
+    """
+    Format a triple as an N-Triples line
+    
+    Args:
+        s: Subject URI
+        p: Predicate URI
+        o: Object URI or literal
+        
+    Returns:
+        N-Triples line (including the trailing newline)
+    """
+    return f"{s.n3()} {p.n3()} {o.n3()} .\n"
+
+class NTriplesBuffer(list):
+    """
+    Lightweight stand-in for an rdflib Graph that stores N-Triples lines
+    
+    entity_to_rdf and link_entities only call graph.add, so the triples can be
+    formatted straight to N-Triples instead of being indexed in an rdflib Graph
+    and serialized afterwards.
+    """
+    
+    def add(self, triple):
+        self.append(nt_triple(*triple))
+
+def _pool_context():
+    """
+    Return the multiprocessing context used for entity recognition workers
+    
+    On Linux workers are forked, so they share the keyword automaton (and the
+    rest of the imported module state) with the parent copy-on-write instead
+    of re-importing the module and rebuilding it.
+    """
+    if sys.platform.startswith("linux") and "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+def sentence_to_ntriples(sentence, ns=HUMANITARIAN):
+    """
+    Recognize entities in a sentence and format their triples as N-Triples
+    
+    Args:
+        sentence: Sentence to analyze
+        ns: Namespace to use for URIs
+        
+    Returns:
+        Tuple of (number of entities recognized, list of N-Triples lines)
+    """
+    # Recognize entities in the sentence
+    entities = recognize_entities(sentence)
+    
+    if not entities:
+        return 0, []
+    
+    # Add entities and their relationships to the buffer
+    # (link_entities adds every unique entity exactly once)
+    buffer = NTriplesBuffer()
+    link_entities(entities, buffer, ns)
+    
+    return len(entities), list(buffer)
+
+def generate_sentence_triples(sentences, ns=HUMANITARIAN, workers=None):
+    """
+    Recognize entities in each sentence and lazily yield their triples
+    
+    Large inputs are spread over a process pool; entity recognition has no
+    shared state, and workers return plain N-Triples strings which are cheap
+    to send back to the parent process.
+    
+    Args:
+        sentences: List of sentences
+        ns: Namespace to use for URIs
+        workers: Number of worker processes (defaults to the CPU count)
+        
+    Yields:
+        N-Triples lines
+    """
+    workers = workers or os.cpu_count() or 1
+    process_sentence = partial(sentence_to_ntriples, ns=ns)
+    entity_count = 0
+    
+    if workers > 1 and len(sentences) >= PARALLEL_MIN_SENTENCES:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+            for count, lines in executor.map(process_sentence, sentences, chunksize=256):
+                entity_count += count
+                yield from lines
+    else:
+        for count, lines in map(process_sentence, sentences):
+            entity_count += count
+            yield from lines
+    
+    logger.info(f"Recognized {entity_count} entities in {len(sentences)} sentences")
+
+def _post_ntriples(lines):
+    """Add a batch of N-Triples lines to the default graph of the dataset"""
+    url = f"{FUSEKI_URL}/{DATASET}/data"
+    headers = {"Content-Type": "application/n-triples; charset=utf-8"}
+    
+    response = _SESSION.post(url, headers=headers, data="".join(lines).encode("utf-8"))
+    
+    if response.status_code == 200 or response.status_code == 201:
+        return True
+    
+    logger.error(f"Error updating triple store: {response.status_code} - {response.text}")
+    return False
+
+def load_sent_triples_filter(path=None):
+    """
+    Load the Bloom filter of triples already sent to the triple store
+    
+    Args:
+        path: Pickle file written by save_sent_triples_filter (if None or
+            missing, a new empty filter is returned)
+        
+    Returns:
+        ScalableBloomFilter of N-Triples line hashes
+    """
+    if path and os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load sent triples filter from {path}: {e}")
+    
+    return ScalableBloomFilter(initial_capacity=1000000, error_rate=1e-6)
+
+def save_sent_triples_filter(sent_filter, path):
+    """
+    Persist the Bloom filter of sent triples for later runs
+    
+    Args:
+        sent_filter: Filter returned by load_sent_triples_filter
+        path: Pickle file to write
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    with open(path, "wb") as f:
+        pickle.dump(sent_filter, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def update_triple_store_batched(nt_lines, batch_size=UPDATE_BATCH_SIZE, sent_filter=None):
+    """
+    Stream N-Triples into the triple store in bounded batches
+    
+    Each batch is POSTed to the Graph Store endpoint over the shared pooled
+    HTTP session, so neither the client nor Fuseki has to hold the whole
+    dataset in one request. Triples whose hash is already in sent_filter are
+    skipped, and the hashes of the triples sent are added to it.
+    
+    Args:
+        nt_lines: Iterable of N-Triples lines (see nt_triple)
+        batch_size: Maximum number of triples per request
+        sent_filter: Bloom filter of triples already sent (see
+            load_sent_triples_filter); if None, duplicates are only
+            skipped within this call
+        
+    Returns:
+        True if all batches were added successfully, False otherwise
+    """
+    if sent_filter is None:
+        sent_filter = load_sent_triples_filter()
+    
+    total = 0
+    skipped = 0
+    batch = []
+    
+    try:
+        for line in nt_lines:
+            line_hash = xxhash.xxh64_intdigest(line.encode("utf-8"))
+            if line_hash in sent_filter:
+                skipped += 1
+                continue
+            sent_filter.add(line_hash)
+            batch.append(line)
+            
+            if len(batch) >= batch_size:
+                if not _post_ntriples(batch):
+                    return False
+                total += len(batch)
+                batch = []
+        
+        if batch:
+            if not _post_ntriples(batch):
+                return False
+            total += len(batch)
+    except Exception as e:
+        logger.error(f"Error connecting to triple store: {e}")
+        return False
+    
+    if total == 0 and skipped == 0:
+        logger.warning("No triples to add to the triple store")
+        return False
+    
+    logger.info(f"Added {total} triples to the triple store ({skipped} already sent)")
+    return True
+
+def process_hdx_data_for_ontology(excel_file_path, sheet_name=None, sent_filter_path=None):
     """
     Process HDX data from an Excel file, extract entities, and populate the ontology
     
     Args:
         excel_file_path: Path to the Excel file
         sheet_name: Name of the sheet to process
+        sent_filter_path: Optional file remembering the triples sent by
+            previous runs, so only new triples are sent. Only use it while the
+            triple store keeps its data (not with an in-memory Fuseki that has
+            been restarted).
         
     Returns:
         True if processing was successful, False otherwise
@@ -348,29 +615,13 @@ def process_hdx_data_for_ontology(excel_file_path, sheet_name=None):
         logger.warning("No sentences extracted from the Excel file")
         return False
     
-    # Initialize a graph for the new triples
-    graph = initialize_graph()
-    
-    # Process each sentence
-    entity_count = 0
-    for sentence in sentences:
-        # Recognize entities in the sentence
-        entities = recognize_entities(sentence)
-        
-        if entities:
-            # Add entities to the graph
-            for entity in entities:
-                entity_to_rdf(entity, graph)
-            
-            # Link entities
-            link_entities(entities, graph)
-            
-            entity_count += len(entities)
-    
-    logger.info(f"Recognized {entity_count} entities in {len(sentences)} sentences")
+    # Stream the triples of each sentence to the triple store in batches
+    sent_filter = load_sent_triples_filter(sent_filter_path)
+    success = update_triple_store_batched(generate_sentence_triples(sentences), sent_filter=sent_filter)
     
-    # Update the triple store with the new triples
-    success = update_triple_store(graph)
+    # Only remember the sent triples once they are all in the triple store
+    if success and sent_filter_path:
+        save_sent_triples_filter(sent_filter, sent_filter_path)
     
     return success
 
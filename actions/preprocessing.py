@@ -7,53 +7,95 @@ HDX datasets (Excel files) for input into the entity recognition model.
 
 import pandas as pd
 import re
-import nltk
-from nltk.tokenize import sent_tokenize
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Download necessary NLTK resources if needed
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+def _select_excel_engine():
+    """Use the Rust-based calamine Excel reader when available, else openpyxl"""
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return "openpyxl"
+    
+    # pandas supports the calamine engine since version 2.2
+    major, minor = (int(part) for part in pd.__version__.split(".")[:2])
+    return "calamine" if (major, minor) >= (2, 2) else "openpyxl"
+
+EXCEL_ENGINE = _select_excel_engine()
+
+# Sentence boundary: whitespace after terminal punctuation, followed by an
+# uppercase letter
+_SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?])\s+(?=[A-ZÀ-Ý])')
+
+def _get_nltk_sent_tokenize():
+    """Import NLTK's Punkt sentence tokenizer, downloading its model if needed"""
+    import nltk
+    from nltk.tokenize import sent_tokenize
+    
+    # Download necessary NLTK resources if needed
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt')
+    
+    return sent_tokenize
 
-def load_hdx_data(excel_file_path, sheet_name=None):
+def load_hdx_data(excel_file_path, sheet_name=None, text_columns=None):
     """
     Load data from an HDX Excel file
     
     Args:
         excel_file_path: Path to the Excel file
-        sheet_name: Name of the sheet to load (if None, loads all sheets)
+        sheet_name: Name of the sheet to load (if None, loads the first sheet)
+        text_columns: List of column names to load (if None, loads all columns).
+            Selected columns are read as strings without type inference.
         
     Returns:
         DataFrame with the loaded data
     """
+    read_kwargs = {}
+    if text_columns:
+        # Only materialize the requested columns; missing ones are reported later
+        wanted = set(text_columns)
+        read_kwargs["usecols"] = lambda column: column in wanted
+        read_kwargs["dtype"] = str
+    
     try:
-        if sheet_name:
-            df = pd.read_excel(excel_file_path, sheet_name=sheet_name)
-            logger.info(f"Loaded {len(df)} rows from sheet '{sheet_name}'")
-        else:
-            # List all available sheets and load them
-            xls = pd.ExcelFile(excel_file_path)
-            sheet_names = xls.sheet_names
+        with pd.ExcelFile(excel_file_path, engine=EXCEL_ENGINE) as xls:
+            if not sheet_name:
+                # Load the first sheet by default or create empty DataFrame
+                if not xls.sheet_names:
+                    logger.warning("No sheets found in the Excel file")
+                    return pd.DataFrame()
+                sheet_name = xls.sheet_names[0]
             
-            # Load the first sheet by default or create empty DataFrame
-            if sheet_names:
-                df = pd.read_excel(excel_file_path, sheet_name=sheet_names[0])
-                logger.info(f"Loaded {len(df)} rows from sheet '{sheet_names[0]}'")
-            else:
-                df = pd.DataFrame()
-                logger.warning("No sheets found in the Excel file")
+            df = xls.parse(sheet_name, **read_kwargs)
+            logger.info(f"Loaded {len(df)} rows from sheet '{sheet_name}'")
         
         return df
     except Exception as e:
         logger.error(f"Error loading Excel file: {e}")
         return pd.DataFrame()
 
+# Patterns used by clean_text, compiled once at import time
+_WHITESPACE_RE = re.compile(r'\s+')
+_UNIT_RE = re.compile(r'(\d+)(km|m|l)\b')
+_PUNCTUATION_RE = re.compile(r'[^\w\s.,?!;:]')
+
+# Unit abbreviations and their expanded forms
+UNIT_EXPANSIONS = {
+    'km': ' kilometers',
+    'm': ' meters',
+    'l': ' liters'
+}
+
+def _expand_unit(match):
+    """Expand a matched unit abbreviation (e.g. "5km" to "5 kilometers")"""
+    return match.group(1) + UNIT_EXPANSIONS[match.group(2)]
+
 def clean_text(text):
     """
     Clean text by removing extra whitespace, expanding units, and normalizing punctuation
@@ -64,25 +106,39 @@ def clean_text(text):
     Returns:
         Cleaned text
     """
-    if not isinstance(text, str):
+    if not isinstance(text, str) or not text:
         return ""
     
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text)
+    # Remove extra whitespace (including tab characters)
+    text = _WHITESPACE_RE.sub(' ', text)
     
     # Expand units (e.g., "5km" to "5 kilometers")
-    text = re.sub(r'(\d+)km', r'\1 kilometers', text)
-    text = re.sub(r'(\d+)m', r'\1 meters', text)
-    text = re.sub(r'(\d+)l', r'\1 liters', text)
+    text = _UNIT_RE.sub(_expand_unit, text)
     
     # Normalize punctuation
-    text = re.sub(r'[^\w\s.,?!;:]', ' ', text)
-    
-    # Remove tab characters
-    text = text.replace('\t', ' ')
+    text = _PUNCTUATION_RE.sub(' ', text)
     
     return text.strip()
 
+def clean_text_series(series):
+    """
+    Vectorized version of clean_text for a pandas Series of strings
+    
+    Args:
+        series: Series of text values (non-null)
+        
+    Returns:
+        Series of cleaned, non-empty text values
+    """
+    series = (series.astype(str)
+              .str.replace(_WHITESPACE_RE, ' ', regex=True)
+              .str.replace(_UNIT_RE, _expand_unit, regex=True)
+              .str.replace(_PUNCTUATION_RE, ' ', regex=True)
+              .str.strip())
+    
+    # Filter out empty strings
+    return series[series.str.len() > 0]
+
 def extract_humanitarian_text(df, text_columns=None):
     """
     Extract humanitarian-related text from specific columns in a DataFrame
@@ -108,43 +164,46 @@ def extract_humanitarian_text(df, text_columns=None):
     
     for column in text_columns:
         if column in df.columns:
-            # Extract non-null values from the column
-            column_texts = df[column].dropna().astype(str).tolist()
-            
-            # Clean each text segment
-            cleaned_texts = [clean_text(text) for text in column_texts]
-            
-            # Filter out empty strings
-            cleaned_texts = [text for text in cleaned_texts if text]
+            # Extract and clean the non-null values of the whole column at once
+            cleaned_texts = clean_text_series(df[column].dropna())
             
-            texts.extend(cleaned_texts)
+            texts.extend(cleaned_texts.tolist())
             logger.info(f"Extracted {len(cleaned_texts)} text segments from column '{column}'")
         else:
             logger.warning(f"Column '{column}' not found in DataFrame")
     
     return texts
 
-def tokenize_sentences(texts):
+def tokenize_sentences(texts, use_nltk=False):
     """
     Tokenize a list of text segments into sentences
     
     Args:
         texts: List of text segments
+        use_nltk: Use NLTK's Punkt tokenizer instead of the regex splitter.
+            Punkt handles abbreviations better but is much slower, and HDX
+            cells are short, simply punctuated segments.
         
     Returns:
         List of sentences
     """
     sentences = []
     
-    for text in texts:
-        # Tokenize into sentences
-        text_sentences = sent_tokenize(text)
-        sentences.extend(text_sentences)
+    if use_nltk:
+        sent_tokenize = _get_nltk_sent_tokenize()
+        for text in texts:
+            # Tokenize into sentences
+            sentences.extend(sent_tokenize(text))
+    else:
+        split = _SENTENCE_BOUNDARY_RE.split
+        for text in texts:
+            # Tokenize into sentences
+            sentences.extend(split(text))
     
     logger.info(f"Tokenized into {len(sentences)} sentences")
     return sentences
 
-def extract_and_preprocess_hdx_data(excel_file_path, sheet_name=None, text_columns=None):
+def extract_and_preprocess_hdx_data(excel_file_path, sheet_name=None, text_columns=None, use_nltk=False):
     """
     Extract and preprocess text from an HDX Excel file
     
@@ -152,12 +211,13 @@ def extract_and_preprocess_hdx_data(excel_file_path, sheet_name=None, text_colum
         excel_file_path: Path to the Excel file
         sheet_name: Name of the sheet to load (if None, loads all sheets)
         text_columns: List of column names to extract text from
+        use_nltk: Use NLTK's Punkt tokenizer for sentence splitting
         
     Returns:
         List of preprocessed sentences for entity recognition
     """
-    # Load the data
-    df = load_hdx_data(excel_file_path, sheet_name)
+    # Load the data (only the text columns when they are known up front)
+    df = load_hdx_data(excel_file_path, sheet_name, text_columns)
     
     if df.empty:
         logger.warning("No data loaded from Excel file")
@@ -171,7 +231,7 @@ def extract_and_preprocess_hdx_data(excel_file_path, sheet_name=None, text_colum
         return []
     
     # Tokenize into sentences
-    sentences = tokenize_sentences(texts)
+    sentences = tokenize_sentences(texts, use_nltk=use_nltk)
     
     return sentences
 
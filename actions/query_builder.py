@@ -5,12 +5,18 @@ This module builds SPARQL queries from NLU intents and entities
 detected by the DIET classifier.
 """
 
+import csv
+import hashlib
+import io
 import logging
-from typing import Dict, Any, List, Text, Optional
-from SPARQLWrapper import SPARQLWrapper, JSON
+import re
+import threading
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, Any, Iterator, List, Text, Optional
+import requests
+from cachetools import TTLCache
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Triple store configuration
@@ -18,67 +24,173 @@ FUSEKI_URL = "http://localhost:3030"
 DATASET = "humanitarian"
 QUERY_ENDPOINT = f"{FUSEKI_URL}/{DATASET}/query"
 
+# Caches for SPARQL results (keyed by query) and formatted responses (keyed by
+# intent and slots), shared by all action server threads
+QUERY_CACHE_SIZE = 512
+QUERY_CACHE_TTL = 300  # seconds
+_CACHE_LOCK = threading.Lock()
+_RESULT_CACHE = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+_RESPONSE_CACHE = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+# One HTTP session per action server thread, so consecutive queries reuse a
+# keep-alive connection to Fuseki
+_thread_local = threading.local()
+
+def _get_session():
+    """Return the HTTP session of the current thread, creating it if needed"""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
+def clear_query_cache():
+    """Clear cached query results, e.g. after the triple store has been updated"""
+    with _CACHE_LOCK:
+        _RESULT_CACHE.clear()
+        _RESPONSE_CACHE.clear()
+
+# Default maximum number of rows returned by a query, and per-intent overrides
+DEFAULT_QUERY_LIMIT = 50
+QUERY_LIMITS = {}
+
+# A whole FILTER line in a query template
+_FILTER_LINE_RE = re.compile(r'^[ \t]*FILTER\(.*\)[ \t]*(?:\n|$)', re.MULTILINE)
+
+def _sparql_str_escape(value):
+    """Escape a value for use inside a double-quoted SPARQL string literal"""
+    return (value.replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", " ").replace("\r", " "))
+
+def _placeholders(entity):
+    """Placeholder names of an entity: its value and its lowercased value"""
+    return (entity, f"{entity}_lc")
+
+def _to_format_string(text, entities):
+    """Escape SPARQL braces in text so only the entity placeholders are formatted"""
+    text = text.replace("{", "{{").replace("}", "}}")
+    for entity in entities:
+        for placeholder in _placeholders(entity):
+            text = text.replace(f"{{{{{placeholder}}}}}", f"{{{placeholder}}}")
+    return text
+
 class QueryTemplate:
     """
     A template for a SPARQL query associated with a specific intent
     """
     
-    def __init__(self, name, query_template, required_entities=None, optional_entities=None):
+    def __init__(self, name, query_template, required_entities=None, optional_entities=None,
+                 default_limit=DEFAULT_QUERY_LIMIT, value_blocks=None):
         """
         Initialize a query template
         
         Args:
             name: Name of the query template
             query_template: SPARQL query template with placeholders for entities
+                and a {limit} placeholder for the maximum number of rows
             required_entities: List of required entity names
             optional_entities: List of optional entity names
+            default_limit: Maximum number of rows if no limit is given
+            value_blocks: List of placeholder names for VALUES blocks, which
+                are inserted without escaping
         """
         self.name = name
         self.query_template = query_template
         self.required_entities = required_entities or []
         self.optional_entities = optional_entities or []
+        self.default_limit = default_limit
+        self.value_blocks = value_blocks or []
+        self._required_set = frozenset(self.required_entities)
+        self._optional_set = frozenset(self.optional_entities)
+        self._variants = self._compile_variants()
+    
+    def _compile_segments(self):
+        """
+        Split the template once into static text and per-entity FILTER lines
+        
+        Returns:
+            List of (entity, format string) tuples, where entity is None for
+            text that is always included
+        """
+        entities = self.required_entities + self.optional_entities
+        segments = []
+        pos = 0
+        
+        for match in _FILTER_LINE_RE.finditer(self.query_template):
+            entity = next(
+                (e for e in entities
+                 if any(f"{{{p}}}" in match.group(0) for p in _placeholders(e))),
+                None
+            )
+            if entity is None:
+                continue
+            segments.append((None, self.query_template[pos:match.start()]))
+            segments.append((entity, match.group(0)))
+            pos = match.end()
+        segments.append((None, self.query_template[pos:]))
+        
+        placeholders = entities + ["limit"] + self.value_blocks
+        return [(entity, _to_format_string(text, placeholders)) for entity, text in segments]
     
-    def build_query(self, slots):
+    def _compile_variants(self):
+        """
+        Precompute the query format string for every combination of present
+        optional entities
+        
+        Returns:
+            Dictionary mapping a frozenset of optional entity names to the
+            format string with exactly their FILTER lines
+        """
+        segments = self._compile_segments()
+        variants = {}
+        
+        for count in range(len(self.optional_entities) + 1):
+            for present in combinations(self.optional_entities, count):
+                present = self._required_set.union(present)
+                variants[present - self._required_set] = "".join(
+                    text for entity, text in segments
+                    if entity is None or entity in present
+                )
+        
+        return variants
+    
+    def build_query(self, slots, limit=None, value_blocks=None):
         """
         Build a SPARQL query from the template using slot values
         
+        FILTER clauses of optional entities without a value are left out.
+        Values are escaped for SPARQL string literals, and each value is also
+        available lowercased as {<entity>_lc}, for case-insensitive CONTAINS
+        filters.
+        
         Args:
             slots: Dictionary of slot values from the NLU
+            limit: Maximum number of rows (defaults to default_limit)
+            value_blocks: Dictionary of VALUES block contents, already in
+                SPARQL syntax
             
         Returns:
             Complete SPARQL query with placeholders replaced by values,
             or None if required entities are missing
         """
-        # Check if all required entities are present
-        for entity in self.required_entities:
-            if entity not in slots or not slots[entity]:
-                logger.warning(f"Missing required entity '{entity}' for query template '{self.name}'")
-                return None
-        
-        # Build query by replacing placeholders with values
-        query = self.query_template
+        values = defaultdict(str, (
+            (name, _sparql_str_escape(str(value)))
+            for name, value in slots.items() if value
+        ))
         
-        # Replace placeholders for required entities
-        for entity in self.required_entities:
-            placeholder = f"{{{entity}}}"
-            value = slots[entity]
-            query = query.replace(placeholder, value)
+        # Check if all required entities are present
+        missing = self._required_set.difference(values)
+        if missing:
+            logger.warning(f"Missing required entities {sorted(missing)} for query template '{self.name}'")
+            return None
         
-        # Replace placeholders for optional entities if present
-        for entity in self.optional_entities:
-            placeholder = f"{{{entity}}}"
-            if entity in slots and slots[entity]:
-                value = slots[entity]
-                query = query.replace(placeholder, value)
-            else:
-                # Handle optional entity absence by removing FILTER clauses
-                # Find and remove FILTER clause containing the placeholder
-                filter_start = query.find(f"FILTER(REGEX(?{entity}", 0)
-                if filter_start != -1:
-                    filter_end = query.find(")", filter_start) + 1
-                    query = query[:filter_start] + query[filter_end:]
+        for name in list(values):
+            values[f"{name}_lc"] = values[name].lower()
+        values["limit"] = int(limit or self.default_limit)
+        if value_blocks:
+            values.update(value_blocks)
         
-        return query
+        return self._variants[self._optional_set.intersection(values)].format_map(values)
 
 # Define query templates for common intents
 QUERY_TEMPLATES = {
@@ -91,12 +203,14 @@ PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 
 SELECT ?facility ?facilityName ?loc ?locName
 WHERE {
+    ?loc rdfs:label ?locName .
+    FILTER(CONTAINS(LCASE(STR(?locName)), "{location_lc}"))
+    ?facility humanitarian:hasLocation ?loc .
     ?facility rdf:type humanitarian:HealthFacility .
     ?facility rdfs:label ?facilityName .
-    ?facility humanitarian:hasLocation ?loc .
-    ?loc rdfs:label ?locName .
-    FILTER(REGEX(?locName, "{location}", "i"))
 }
+ORDER BY ?facilityName ?facility
+LIMIT {limit}
         """,
         required_entities=[],
         optional_entities=["location"]
@@ -111,13 +225,15 @@ PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 
 SELECT ?source ?sourceName ?locName ?status
 WHERE {
+    ?loc rdfs:label ?locName .
+    FILTER(CONTAINS(LCASE(STR(?locName)), "{location_lc}"))
+    ?source humanitarian:hasLocation ?loc .
     ?source rdf:type humanitarian:WaterSource .
     ?source rdfs:label ?sourceName .
-    ?source humanitarian:hasLocation ?loc .
-    ?loc rdfs:label ?locName .
     ?source humanitarian:hasStatus ?status .
-    FILTER(REGEX(?locName, "{location}", "i"))
 }
+ORDER BY ?sourceName ?source
+LIMIT {limit}
         """,
         required_entities=[],
         optional_entities=["location"]
@@ -132,14 +248,16 @@ PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 
 SELECT ?camp ?campName ?locName ?capacity ?status
 WHERE {
+    ?loc rdfs:label ?locName .
+    FILTER(CONTAINS(LCASE(STR(?locName)), "{location_lc}"))
+    ?camp humanitarian:hasLocation ?loc .
     ?camp rdf:type humanitarian:Camp .
     ?camp rdfs:label ?campName .
-    ?camp humanitarian:hasLocation ?loc .
-    ?loc rdfs:label ?locName .
     ?camp humanitarian:hasCapacity ?capacity .
     ?camp humanitarian:hasStatus ?status .
-    FILTER(REGEX(?locName, "{location}", "i"))
 }
+ORDER BY ?campName ?camp
+LIMIT {limit}
         """,
         required_entities=[],
         optional_entities=["location"]
@@ -154,21 +272,70 @@ PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 
 SELECT ?organization ?orgName ?locName ?service ?serviceName
 WHERE {
+    ?loc rdfs:label ?locName .
+    FILTER(CONTAINS(LCASE(STR(?locName)), "{location_lc}"))
+    ?organization humanitarian:hasLocation ?loc .
     ?organization rdf:type humanitarian:NGO .
     ?organization rdfs:label ?orgName .
     ?organization humanitarian:providesService ?service .
     ?service rdfs:label ?serviceName .
-    ?organization humanitarian:hasLocation ?loc .
-    ?loc rdfs:label ?locName .
-    FILTER(REGEX(?serviceName, "{request_type}", "i"))
-    FILTER(REGEX(?locName, "{location}", "i"))
+    FILTER(CONTAINS(LCASE(STR(?serviceName)), "{request_type_lc}"))
 }
+ORDER BY ?orgName ?serviceName ?organization
+LIMIT {limit}
         """,
         required_entities=[],
         optional_entities=["request_type", "location"]
     )
 }
 
+# Aid requests with a location are answered in two steps, so a follow-up that
+# only changes the request type reuses the cached organizations of the location
+ORGS_BY_LOCATION_TEMPLATE = QueryTemplate(
+    name="orgs_by_location",
+    query_template="""
+PREFIX humanitarian: <http://example.org/humanitarian#>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+
+SELECT ?organization ?orgName ?locName
+WHERE {
+    ?loc rdfs:label ?locName .
+    FILTER(CONTAINS(LCASE(STR(?locName)), "{location_lc}"))
+    ?organization humanitarian:hasLocation ?loc .
+    ?organization rdf:type humanitarian:NGO .
+    ?organization rdfs:label ?orgName .
+}
+ORDER BY ?orgName ?organization
+LIMIT {limit}
+    """,
+    required_entities=["location"],
+    default_limit=500
+)
+
+SERVICES_FOR_ORGS_TEMPLATE = QueryTemplate(
+    name="services_for_orgs",
+    query_template="""
+PREFIX humanitarian: <http://example.org/humanitarian#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+
+SELECT ?organization ?service ?serviceName
+WHERE {
+    VALUES ?organization { {organizations} }
+    ?organization humanitarian:providesService ?service .
+    ?service rdfs:label ?serviceName .
+    FILTER(CONTAINS(LCASE(STR(?serviceName)), "{request_type_lc}"))
+}
+ORDER BY ?organization ?serviceName
+    """,
+    required_entities=[],
+    optional_entities=["request_type"],
+    value_blocks=["organizations"]
+)
+
+# Characters that cannot appear in an IRI reference
+_IRI_INVALID_RE = re.compile(r'[<>"{}|^`\\\s]')
+
 def get_query_for_intent(intent, slots):
     """
     Get a SPARQL query for a specific intent using slot values
@@ -182,7 +349,7 @@ def get_query_for_intent(intent, slots):
     """
     if intent in QUERY_TEMPLATES:
         template = QUERY_TEMPLATES[intent]
-        return template.build_query(slots)
+        return template.build_query(slots, limit=QUERY_LIMITS.get(intent))
     else:
         logger.warning(f"No query template found for intent '{intent}'")
         return None
@@ -195,85 +362,171 @@ def execute_query(query):
         query: SPARQL query to execute
         
     Returns:
-        Query results as a dictionary, or None if execution fails
+        List of result rows (dictionaries mapping variable names to values,
+        empty for unbound variables), or None if execution fails
     """
-    sparql = SPARQLWrapper(QUERY_ENDPOINT)
-    sparql.setQuery(query)
-    sparql.setReturnFormat(JSON)
+    key = hashlib.blake2b(query.encode("utf-8")).digest()
+    with _CACHE_LOCK:
+        results = _RESULT_CACHE.get(key)
+    if results is not None:
+        return results
     
     try:
-        results = sparql.query().convert()
-        return results
+        # SPARQL CSV results carry just the plain values, which is all the
+        # formatters need, and are much smaller and cheaper to parse than JSON
+        response = _get_session().post(
+            QUERY_ENDPOINT,
+            data={"query": query},
+            headers={"Accept": "text/csv"}
+        )
+        response.raise_for_status()
+        results = list(csv.DictReader(io.StringIO(response.content.decode("utf-8"))))
     except Exception as e:
         logger.error(f"Error executing query: {e}")
         return None
+    
+    with _CACHE_LOCK:
+        _RESULT_CACHE[key] = results
+    return results
 
-def format_query_results(results, intent):
+def query_aid_request(slots):
     """
-    Format query results into a natural language response
+    Find organizations at a location that provide the requested service
+    
+    The organizations of the location and their services are queried
+    separately, so both sub-results are cached on their own and a follow-up
+    that only changes the request type reuses the organizations.
+    
+    Args:
+        slots: Dictionary of slot values, including the location
+        
+    Returns:
+        List of result rows with the variables of the aid request template,
+        or None if a query fails
+    """
+    limit = QUERY_LIMITS.get("submit_aid_request_swa") or DEFAULT_QUERY_LIMIT
+    
+    organizations = execute_query(ORGS_BY_LOCATION_TEMPLATE.build_query(slots))
+    if not organizations:
+        return organizations
+    
+    uris = [row["organization"] for row in organizations
+            if not _IRI_INVALID_RE.search(row["organization"])]
+    if not uris:
+        return []
+    
+    query = SERVICES_FOR_ORGS_TEMPLATE.build_query(
+        slots,
+        value_blocks={"organizations": " ".join(f"<{uri}>" for uri in uris)}
+    )
+    services = execute_query(query)
+    if services is None:
+        return None
+    
+    services_by_org = defaultdict(list)
+    for row in services:
+        services_by_org[row["organization"]].append(row)
+    
+    # Join the sub-results in organization order, as the single query would
+    results = []
+    for org in organizations:
+        for service in services_by_org.get(org["organization"], ()):
+            results.append({**org, "service": service["service"], "serviceName": service["serviceName"]})
+            if len(results) >= limit:
+                return results
+    
+    return results
+
+# Response formats per intent: (header, result variables, line format)
+RESPONSE_FORMATS = {
+    "query_health_facilities_swa": (
+        "Hii ni vituo vya afya vilivyopo:\n",
+        ("facilityName", "locName"),
+        "- {0} ({1})\n"
+    ),
+    "query_water_sources_swa": (
+        "Hii ni vyanzo vya maji vilivyopo:\n",
+        ("sourceName", "locName", "status"),
+        "- {0} ({1}) - {2}\n"
+    ),
+    "query_camps_swa": (
+        "Hii ni kambi za wakimbizi ziliopo:\n",
+        ("campName", "locName", "capacity"),
+        "- {0} ({1}) - Uwezo: {2}\n"
+    ),
+    "submit_aid_request_swa": (
+        "Mashirika yanayotoa huduma hiyo:\n",
+        ("orgName", "locName", "serviceName"),
+        "- {0} ({1}) - {2}\n"
+    )
+}
+
+# Responses per intent when a query returns no results
+EMPTY_RESPONSES = {
+    "query_health_facilities_swa": "Samahani, hakuna vituo vya afya vilivyopatikana.",
+    "query_water_sources_swa": "Samahani, hakuna vyanzo vya maji vilivyopatikana.",
+    "query_camps_swa": "Samahani, hakuna kambi za wakimbizi zilizopatikana.",
+    "submit_aid_request_swa": "Samahani, hakuna mashirika yanayotoa huduma hiyo yaliyopatikana."
+}
+DEFAULT_EMPTY_RESPONSE = "Samahani, hakuna majibu yaliyopatikana."
+
+# Maximum number of response chunks (header and result lines) per message
+RESPONSE_PAGE_SIZE = 50
+
+def iter_format(results, intent) -> Iterator[Text]:
+    """
+    Format query results into a natural language response, chunk by chunk
     
     Args:
         results: Query results from execute_query
         intent: Intent name from the NLU
         
-    Returns:
-        Formatted response string in Congolese Swahili
+    Yields:
+        The response header, then one chunk per result row
     """
-    if not results or 'results' not in results or not results['results']['bindings']:
-        if intent == "query_health_facilities_swa":
-            return "Samahani, hakuna vituo vya afya vilivyopatikana."
-        elif intent == "query_water_sources_swa":
-            return "Samahani, hakuna vyanzo vya maji vilivyopatikana."
-        elif intent == "query_camps_swa":
-            return "Samahani, hakuna kambi za wakimbizi zilizopatikana."
-        elif intent == "submit_aid_request_swa":
-            return "Samahani, hakuna mashirika yanayotoa huduma hiyo yaliyopatikana."
-        else:
-            return "Samahani, hakuna majibu yaliyopatikana."
-    
-    bindings = results['results']['bindings']
+    if not results:
+        yield EMPTY_RESPONSES.get(intent, DEFAULT_EMPTY_RESPONSE)
+        return
     
-    # Format response based on intent
-    if intent == "query_health_facilities_swa":
-        response = "Hii ni vituo vya afya vilivyopo:\n"
-        for binding in bindings:
-            facility_name = binding.get('facilityName', {}).get('value', 'Unknown')
-            location = binding.get('locName', {}).get('value', 'Unknown')
-            response += f"- {facility_name} ({location})\n"
-    
-    elif intent == "query_water_sources_swa":
-        response = "Hii ni vyanzo vya maji vilivyopo:\n"
-        for binding in bindings:
-            source_name = binding.get('sourceName', {}).get('value', 'Unknown')
-            location = binding.get('locName', {}).get('value', 'Unknown')
-            status = binding.get('status', {}).get('value', 'Unknown')
-            response += f"- {source_name} ({location}) - {status}\n"
-    
-    elif intent == "query_camps_swa":
-        response = "Hii ni kambi za wakimbizi ziliopo:\n"
-        for binding in bindings:
-            camp_name = binding.get('campName', {}).get('value', 'Unknown')
-            location = binding.get('locName', {}).get('value', 'Unknown')
-            capacity = binding.get('capacity', {}).get('value', 'Unknown')
-            response += f"- {camp_name} ({location}) - Uwezo: {capacity}\n"
-    
-    elif intent == "submit_aid_request_swa":
-        response = "Mashirika yanayotoa huduma hiyo:\n"
-        for binding in bindings:
-            org_name = binding.get('orgName', {}).get('value', 'Unknown')
-            service_name = binding.get('serviceName', {}).get('value', 'Unknown')
-            location = binding.get('locName', {}).get('value', 'Unknown')
-            response += f"- {org_name} ({location}) - {service_name}\n"
+    response_format = RESPONSE_FORMATS.get(intent)
     
-    else:
-        response = "Majibu yaliyopatikana:\n"
+    if response_format is None:
+        yield "Majibu yaliyopatikana:\n"
         # Generic response for other intents
-        for i, binding in enumerate(bindings):
-            response += f"Jibu {i+1}:\n"
-            for var, value in binding.items():
-                response += f"  {var}: {value['value']}\n"
+        for i, row in enumerate(results):
+            yield f"Jibu {i+1}:\n" + "".join(f"  {var}: {value}\n" for var, value in row.items())
+        return
+    
+    # Format response based on intent
+    header, fields, line_format = response_format
+    yield header
+    for row in results:
+        get = row.get
+        yield line_format.format(*[get(field) or 'Unknown' for field in fields])
+
+def format_query_results(results, intent):
+    """
+    Format query results into a natural language response
     
-    return response
+    Args:
+        results: Query results from execute_query
+        intent: Intent name from the NLU
+        
+    Returns:
+        Formatted response string in Congolese Swahili
+    """
+    return "".join(iter_format(results, intent))
+
+def _paginate(chunks, page_size):
+    """Split a list of response chunks into pages of at most page_size chunks"""
+    for start in range(0, len(chunks), page_size):
+        yield chunks[start:start + page_size]
+
+def _canon(value):
+    """Canonicalize a text slot value: lowercase, strip and collapse whitespace"""
+    if not isinstance(value, str):
+        return value
+    return " ".join(value.strip().lower().split())
 
 def process_nlu_for_query(intent, slots, rasa_entities=None):
     """
@@ -287,25 +540,64 @@ def process_nlu_for_query(intent, slots, rasa_entities=None):
     Returns:
         Formatted response string in Congolese Swahili
     """
-    # Build query from intent and slots
-    query = get_query_for_intent(intent, slots)
+    return "".join(process_nlu_for_query_pages(intent, slots, rasa_entities))
+
+def process_nlu_for_query_pages(intent, slots, rasa_entities=None):
+    """
+    Process NLU output and execute a SPARQL query, returning the response
+    split into messages of at most RESPONSE_PAGE_SIZE chunks
     
-    if not query:
-        return "Samahani, sikuweza kuunda hoja kwa ajili ya swali lako."
+    Args:
+        intent: Intent name from the NLU
+        slots: Dictionary of slot values from the NLU
+        rasa_entities: Entities detected by Rasa (optional)
+        
+    Returns:
+        Tuple of response messages in Congolese Swahili
+    """
+    # Canonical slot values are used both in the query and in the cache key,
+    # so "Goma" and "goma " share a cache entry (the filters are case-insensitive)
+    slots = {name: _canon(value) for name, value in slots.items() if value}
     
-    # Log the query for debugging
-    logger.info(f"Executing SPARQL query: {query}")
+    # Repeated questions are answered from the cache without building or
+    # executing the query again
+    cache_key = (intent, tuple(sorted((name, str(value)) for name, value in slots.items())))
+    with _CACHE_LOCK:
+        response = _RESPONSE_CACHE.get(cache_key)
+    if response is not None:
+        return response
     
-    # Recognize entities and expand query if needed (using entities detected by Rasa)
-    from actions.ontology_population import recognize_entities
-    if rasa_entities:
+    if rasa_entities and logger.isEnabledFor(logging.DEBUG):
         # For debugging, log the Rasa entities
-        logger.info(f"Using {len(rasa_entities)} entities from Rasa for query enrichment")
+        logger.debug("Using %d entities from Rasa for query enrichment", len(rasa_entities))
     
-    # Execute query
-    results = execute_query(query)
+    if intent == "submit_aid_request_swa" and slots.get("location"):
+        # Aid requests with a location reuse the cached organizations
+        results = query_aid_request(slots)
+    else:
+        # Build query from intent and slots
+        query = get_query_for_intent(intent, slots)
+        
+        if not query:
+            return ("Samahani, sikuweza kuunda hoja kwa ajili ya swali lako.",)
+        
+        # Log the query for debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Executing SPARQL query: %s", query)
+        
+        # Execute query
+        results = execute_query(query)
+    
+    # Format results, paginating long result lists
+    chunks = list(iter_format(results, intent))
+    if len(chunks) > RESPONSE_PAGE_SIZE:
+        response = tuple("".join(page) for page in _paginate(chunks, RESPONSE_PAGE_SIZE))
+    else:
+        response = ("".join(chunks),)
     
-    # Format results
-    response = format_query_results(results, intent)
+    # Failed queries are not cached so they are retried on the next turn
+    if results is not None:
+        with _CACHE_LOCK:
+            _RESPONSE_CACHE[cache_key] = response
     
     return response 
\ No newline at end of file
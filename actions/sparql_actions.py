@@ -6,7 +6,7 @@ using SPARQL to retrieve information based on user intents and entities.
 It is customized for the humanitarian ontology for North Kivu.
 """
 
-from typing import Any, Dict, List, Text
+from typing import Any, Dict, List, Text, Tuple
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet
@@ -18,7 +18,7 @@ import logging
 # Import our custom modules
 from actions.preprocessing import extract_and_preprocess_hdx_data
 from actions.ontology_population import recognize_entities, process_hdx_data_for_ontology
-from actions.query_builder import process_nlu_for_query, get_query_for_intent, execute_query, format_query_results
+from actions.query_builder import process_nlu_for_query_pages, get_query_for_intent, execute_query, format_query_results, clear_query_cache
 
 logger = logging.getLogger(__name__)
 
@@ -32,142 +32,85 @@ def extract_rasa_entities(tracker):
         return latest_message['entities']
     return []
 
-class ActionQueryHealthFacilities(Action):
-    """Query for health facilities based on location"""
-
-    def name(self) -> Text:
-        return "action_query_health_facilities"
-
+class QueryActionMixin:
+    """
+    Shared run() for actions that answer an intent with a SPARQL query
+    
+    Subclasses set INTENT (the query template to use) and SLOT_NAMES (the
+    slots passed to the query builder) and implement name().
+    """
+    
+    INTENT: Text = ""
+    SLOT_NAMES: Tuple[Text, ...] = ()
+    
     def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
+        # Read the latest message and the slots once
+        latest_message = tracker.latest_message or {}
+        slot_values = tracker.slots
+        
         # Extract entities from the user message
-        location = tracker.get_slot("location")
+        slots = {name: slot_values[name] for name in self.SLOT_NAMES if slot_values.get(name)}
         
         # Extract all Rasa-detected entities
-        rasa_entities = extract_rasa_entities(tracker)
-        user_message = tracker.latest_message.get('text', '')
+        rasa_entities = latest_message.get('entities', [])
         
         # Log the detected entities
-        logger.info(f"Rasa detected entities: {rasa_entities}")
-        logger.info(f"User message: {user_message}")
-        
-        # Use the query builder to generate and execute the query
-        slots = {"location": location} if location else {}
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Rasa detected entities: %s", rasa_entities)
+            logger.debug("User message: %s", latest_message.get('text', ''))
         
         # Process the NLU output and get a response
-        response = process_nlu_for_query("query_health_facilities_swa", slots, rasa_entities)
+        pages = process_nlu_for_query_pages(self.INTENT, slots, rasa_entities)
         
-        # Send the response to the user
-        dispatcher.utter_message(text=response)
+        # Send the response to the user, one message per page
+        for page in pages:
+            dispatcher.utter_message(text=page)
         
         return []
 
 
-class ActionQueryWaterSources(Action):
+class ActionQueryHealthFacilities(QueryActionMixin, Action):
+    """Query for health facilities based on location"""
+    
+    INTENT = "query_health_facilities_swa"
+    SLOT_NAMES = ("location",)
+
+    def name(self) -> Text:
+        return "action_query_health_facilities"
+
+
+class ActionQueryWaterSources(QueryActionMixin, Action):
     """Query for water sources based on location"""
+    
+    INTENT = "query_water_sources_swa"
+    SLOT_NAMES = ("location",)
 
     def name(self) -> Text:
         return "action_query_water_sources"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
-        
-        # Extract entities from the user message
-        location = tracker.get_slot("location")
-        
-        # Extract all Rasa-detected entities
-        rasa_entities = extract_rasa_entities(tracker)
-        user_message = tracker.latest_message.get('text', '')
-        
-        # Log the detected entities
-        logger.info(f"Rasa detected entities: {rasa_entities}")
-        logger.info(f"User message: {user_message}")
-        
-        # Use the query builder to generate and execute the query
-        slots = {"location": location} if location else {}
-        
-        # Process the NLU output and get a response
-        response = process_nlu_for_query("query_water_sources_swa", slots, rasa_entities)
-        
-        # Send the response to the user
-        dispatcher.utter_message(text=response)
-        
-        return []
-
 
-class ActionQueryCamps(Action):
+class ActionQueryCamps(QueryActionMixin, Action):
     """Query for displacement camps based on location, capacity, manager, and coordinator"""
+    
+    INTENT = "query_camps_swa"
+    SLOT_NAMES = ("location",)
 
     def name(self) -> Text:
         return "action_query_camps"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
-        
-        # Extract entities from the user message
-        location = tracker.get_slot("location")
-        
-        # Extract all Rasa-detected entities
-        rasa_entities = extract_rasa_entities(tracker)
-        user_message = tracker.latest_message.get('text', '')
-        
-        # Log the detected entities
-        logger.info(f"Rasa detected entities: {rasa_entities}")
-        logger.info(f"User message: {user_message}")
-        
-        # Use the query builder to generate and execute the query
-        slots = {"location": location} if location else {}
-        
-        # Process the NLU output and get a response
-        response = process_nlu_for_query("query_camps_swa", slots, rasa_entities)
-        
-        # Send the response to the user
-        dispatcher.utter_message(text=response)
-        
-        return []
-
 
-class ActionSubmitAidRequest(Action):
+class ActionSubmitAidRequest(QueryActionMixin, Action):
     """Submit an aid request and find suitable organizations"""
+    
+    INTENT = "submit_aid_request_swa"
+    SLOT_NAMES = ("request_type", "location")
 
     def name(self) -> Text:
         return "action_submit_aid_request"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
-        
-        # Extract entities from the user message
-        request_type = tracker.get_slot("request_type")
-        location = tracker.get_slot("location")
-        
-        # Extract all Rasa-detected entities
-        rasa_entities = extract_rasa_entities(tracker)
-        user_message = tracker.latest_message.get('text', '')
-        
-        # Log the detected entities
-        logger.info(f"Rasa detected entities: {rasa_entities}")
-        logger.info(f"User message: {user_message}")
-        
-        # Use the query builder to generate and execute the query
-        slots = {}
-        if request_type:
-            slots["request_type"] = request_type
-        if location:
-            slots["location"] = location
-        
-        # Process the NLU output and get a response
-        response = process_nlu_for_query("submit_aid_request_swa", slots, rasa_entities)
-        
-        # Send the response to the user
-        dispatcher.utter_message(text=response)
-        
-        return []
-
 
 class ActionProcessHdxData(Action):
     """Process HDX data and populate the ontology"""
@@ -189,6 +132,8 @@ class ActionProcessHdxData(Action):
             success = process_hdx_data_for_ontology(excel_file)
             
             if success:
+                # Cached answers may be stale now that the triple store changed
+                clear_query_cache()
                 dispatcher.utter_message(text="Nimesindika data ya HDX na kuongeza ontolojia.")
             else:
                 dispatcher.utter_message(text="Samahani, kulikuwa na shida wakati wa kusindika data ya HDX.")
@@ -210,22 +155,20 @@ class ActionCreateSparqlQuery(Action):
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Extract the intent and entities from the user message
-        intent = tracker.latest_message.get("intent", {}).get("name", "")
+        latest_message = tracker.latest_message or {}
+        intent = latest_message.get("intent", {}).get("name", "")
         
         # Extract all slots
-        slots = {}
-        for slot in tracker.slots:
-            value = tracker.get_slot(slot)
-            if value:
-                slots[slot] = value
+        slots = {slot: value for slot, value in tracker.slots.items() if value}
         
         # Extract Rasa-detected entities for debugging
-        rasa_entities = extract_rasa_entities(tracker)
-        user_message = tracker.latest_message.get('text', '')
+        rasa_entities = latest_message.get('entities', [])
+        user_message = latest_message.get('text', '')
         
         # Log the detected entities
-        logger.info(f"Rasa detected entities: {rasa_entities}")
-        logger.info(f"User message: {user_message}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Rasa detected entities: %s", rasa_entities)
+            logger.debug("User message: %s", user_message)
         
         # Generate the SPARQL query
         query = get_query_for_intent(intent, slots)
@@ -11,11 +11,18 @@ Usage:
 """
 
 import os
+import re
 import sys
-import json
 import logging
 import argparse
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+from json_utils import dumps_compact, dumps_pretty
+
+# Line editing for the prompts (not available on all platforms)
+try:
+    import readline
+except ImportError:
+    readline = None
 
 # Configure logging
 logging.basicConfig(
@@ -38,6 +45,10 @@ TASK_TYPES = [
 # Define error types
 ERROR_TYPES = [None, "substitution", "deletion", "insertion"]
 
+# A turn in a raw dialogue file: speaker prefix and content
+TURN_LINE_RE = re.compile(r'^(User|Bot):\s*(.*)$')
+SPEAKERS = {"User": "user", "Bot": "bot"}
+
 def load_raw_dialogues(input_file: str) -> List[Dict[str, Any]]:
     """
     Load raw dialogues from a text file
@@ -49,43 +60,46 @@ def load_raw_dialogues(input_file: str) -> List[Dict[str, Any]]:
         List of parsed dialogues
     """
     dialogues = []
+    dialogues_append = dialogues.append
     current_dialogue = None
+    # Number of completed dialogues and of turns in the current dialogue
+    dialogue_count = 0
+    turn_count = 0
     
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
         # Simple parsing logic - assumes dialogues are separated by blank lines
         # and turns are in format "User: ..." or "Bot: ..."
-        for line in lines:
-            line = line.strip()
-            
-            if not line:
-                # End of dialogue
-                if current_dialogue and current_dialogue.get("turns"):
-                    dialogues.append(current_dialogue)
-                current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": []}
-                continue
-            
-            if not current_dialogue:
-                current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": []}
-            
-            # Check if line starts with User: or Bot:
-            if line.startswith("User:") or line.startswith("Bot:"):
-                speaker = "user" if line.startswith("User:") else "bot"
-                content = line[5:].strip() if speaker == "user" else line[4:].strip()
+        # The file is parsed line by line as it is read
+        with open(input_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                
+                if not line:
+                    # End of dialogue
+                    if turn_count:
+                        dialogues_append(current_dialogue)
+                        dialogue_count += 1
+                    current_dialogue = {"id": f"dialogue_{dialogue_count+1}", "turns": []}
+                    turn_count = 0
+                    continue
                 
-                turn = {
-                    "id": f"turn_{len(current_dialogue['turns'])+1}",
-                    "speaker": speaker,
-                    "text": line,
-                    "content": content
-                }
-                current_dialogue["turns"].append(turn)
+                if not current_dialogue:
+                    current_dialogue = {"id": f"dialogue_{dialogue_count+1}", "turns": []}
+                
+                # Check if line starts with User: or Bot:
+                match = TURN_LINE_RE.match(line)
+                if match:
+                    turn_count += 1
+                    current_dialogue["turns"].append({
+                        "id": turn_count,
+                        "speaker": SPEAKERS[match.group(1)],
+                        "text": line,
+                        "content": match.group(2)
+                    })
         
         # Add the last dialogue
-        if current_dialogue and current_dialogue.get("turns"):
-            dialogues.append(current_dialogue)
+        if turn_count:
+            dialogues_append(current_dialogue)
         
         logger.info(f"Loaded {len(dialogues)} raw dialogues from {input_file}")
         return dialogues
@@ -94,6 +108,96 @@ def load_raw_dialogues(input_file: str) -> List[Dict[str, Any]]:
         logger.error(f"Failed to load raw dialogues from {input_file}: {e}")
         return []
 
+def parse_turn_spec(spec: str) -> Tuple[int, Optional[List[Tuple[int, bool]]], Optional[int]]:
+    """
+    Parse a compact annotation of a bot turn, e.g. "2 1y 3n subst"
+    
+    The spec is the number of tasks, optionally followed by one token per
+    task (task type number with a y/n success suffix, y if omitted) and
+    then the error type (number or name prefix). Parts that are left out
+    are prompted for step by step.
+    
+    Args:
+        spec: Compact turn annotation entered by the user
+    
+    Returns:
+        Tuple of (number of tasks, list of (task type index, success) or
+        None, error type index or None)
+    
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    tokens = spec.split()
+    if not tokens:
+        return 0, None, None
+    
+    num_tasks = int(tokens[0])
+    if not 0 <= num_tasks <= 5:
+        raise ValueError(f"Number of tasks out of range: {num_tasks}")
+    if len(tokens) == 1:
+        return num_tasks, None, None
+    
+    task_tokens = tokens[1:num_tasks + 1]
+    if len(task_tokens) < num_tasks:
+        raise ValueError(f"Expected {num_tasks} task specs, got {len(task_tokens)}")
+    
+    tasks = []
+    for token in task_tokens:
+        success = True
+        if token[-1] in "yn":
+            success = token[-1] == "y"
+            token = token[:-1]
+        type_idx = int(token) - 1
+        if not 0 <= type_idx < len(TASK_TYPES):
+            raise ValueError(f"Task type out of range: {token}")
+        tasks.append((type_idx, success))
+    
+    rest = tokens[num_tasks + 1:]
+    if not rest:
+        return num_tasks, tasks, None
+    if len(rest) > 1:
+        raise ValueError(f"Unexpected tokens: {' '.join(rest[1:])}")
+    
+    error_token = rest[0].lower()
+    if error_token.isdigit():
+        error_idx = int(error_token)
+        if not 0 <= error_idx < len(ERROR_TYPES):
+            raise ValueError(f"Error type out of range: {error_token}")
+    else:
+        names = [str(error_type).lower() for error_type in ERROR_TYPES]
+        matches = [i for i, name in enumerate(names) if name.startswith(error_token)]
+        if len(matches) != 1:
+            raise ValueError(f"Unknown error type: {error_token}")
+        error_idx = matches[0]
+    
+    return num_tasks, tasks, error_idx
+
+# Menus printed at the prompts, built once
+TASK_MENU = "\nTask types:\n" + "".join(
+    f"  {i}. {task_type}\n" for i, task_type in enumerate(TASK_TYPES, 1)
+)
+ERROR_MENU = "\nError types:\n" + "".join(
+    f"  {i}. {error_type if error_type else 'None'}\n" for i, error_type in enumerate(ERROR_TYPES, 0)
+)
+
+# Words offered by tab completion at the prompts: error type names (accepted
+# in turn specs) and answers to the yes/no questions
+COMPLETION_WORDS = [str(error_type).lower() for error_type in ERROR_TYPES] + ["yes", "no"]
+
+def _complete_word(text: str, state: int) -> Optional[str]:
+    """readline completer for COMPLETION_WORDS"""
+    matches = [word for word in COMPLETION_WORDS if word.startswith(text.lower())]
+    return matches[state] if state < len(matches) else None
+
+def setup_readline() -> None:
+    """Enable tab completion and in-memory history (arrow-key recall) for the prompts"""
+    if readline is None:
+        return
+    readline.parse_and_bind('tab: complete')
+    readline.set_completer_delims(' ')
+    readline.set_completer(_complete_word)
+    readline.set_history_length(100)
+
 def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Interactively annotate dialogues with task and error information
@@ -105,26 +209,28 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
         List of annotated dialogues
     """
     annotated_dialogues = []
+    setup_readline()
+    write = sys.stdout.write
+    
+    # Counts are the same for every turn, so compute them once
+    n_dialogues = len(dialogues)
+    n_tasks = len(TASK_TYPES)
+    n_errors = len(ERROR_TYPES)
     
     print("\n" + "="*50)
     print("DIALOGUE ANNOTATION TOOL FOR ONTOLOGY PIPELINE EVALUATION")
     print("="*50)
-    print("\nTask types:")
-    for i, task_type in enumerate(TASK_TYPES, 1):
-        print(f"  {i}. {task_type}")
-    
-    print("\nError types:")
-    for i, error_type in enumerate(ERROR_TYPES, 0):
-        print(f"  {i}. {error_type if error_type else 'None'}")
+    write(TASK_MENU)
+    write(ERROR_MENU)
     
     for dialogue_idx, dialogue in enumerate(dialogues, 1):
         print("\n" + "="*50)
-        print(f"DIALOGUE {dialogue_idx}/{len(dialogues)}: {dialogue['id']}")
+        print(f"DIALOGUE {dialogue_idx}/{n_dialogues}: {dialogue['id']}")
         print("="*50)
         
         # Print dialogue for reference
-        for i, turn in enumerate(dialogue.get("turns", []), 1):
-            print(f"{i}. {turn.get('text', '')}")
+        for i, turn in enumerate(dialogue["turns"], 1):
+            print(f"{i}. {turn['text']}")
         
         # Create a copy with annotated turns
         annotated_dialogue = {
@@ -134,49 +240,54 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
         }
         
         # Process each turn
-        for i, turn in enumerate(dialogue.get("turns", []), 1):
+        for i, turn in enumerate(dialogue["turns"], 1):
             print("\n" + "-"*30)
-            print(f"Turn {i}: {turn.get('text', '')}")
+            print(f"Turn {i}: {turn['text']}")
             
             # Create annotated turn
             annotated_turn = {
                 "id": turn["id"],
-                "text": turn.get("text", ""),
-                "speaker": turn.get("speaker", ""),
-                "content": turn.get("content", ""),
+                "text": turn["text"],
+                "speaker": turn["speaker"],
+                "content": turn["content"],
                 "tasks": []
             }
             
             # Only ask for tasks and errors for bot turns
-            if turn.get("speaker") == "bot":
-                # Ask for tasks
+            if turn["speaker"] == "bot":
+                # Ask for tasks, either as a full turn spec (e.g. "2 1y 3n subst")
+                # or just the number of tasks followed by step-by-step prompts
                 while True:
                     try:
-                        num_tasks = input(f"Number of tasks in this turn (0-5) [0]: ")
-                        num_tasks = int(num_tasks) if num_tasks.strip() else 0
-                        if 0 <= num_tasks <= 5:
-                            break
-                        print("Please enter a number between 0 and 5")
+                        turn_spec = input(f"Number of tasks in this turn (0-5), optionally with task types and error type [0]: ")
+                        num_tasks, task_specs, error_idx = parse_turn_spec(turn_spec)
+                        break
                     except ValueError:
-                        print("Please enter a valid number")
+                        print("Please enter a number between 0 and 5, or a spec like '2 1y 3n subst'")
                 
                 # Get task details
                 for j in range(num_tasks):
-                    task = {"id": f"task_{turn['id']}_{j+1}"}
+                    task = {"id": j + 1}
+                    
+                    if task_specs is not None:
+                        # Task type and success were given in the turn spec
+                        type_idx, success = task_specs[j]
+                        task["type"] = TASK_TYPES[type_idx]
+                        task["success"] = success
+                        annotated_turn["tasks"].append(task)
+                        continue
                     
                     # Get task type
                     while True:
                         try:
-                            print("\nTask types:")
-                            for k, task_type in enumerate(TASK_TYPES, 1):
-                                print(f"  {k}. {task_type}")
+                            write(TASK_MENU)
                             
-                            type_idx = input(f"Task {j+1} type (1-{len(TASK_TYPES)}): ")
+                            type_idx = input(f"Task {j+1} type (1-{n_tasks}): ")
                             type_idx = int(type_idx) - 1
-                            if 0 <= type_idx < len(TASK_TYPES):
+                            if 0 <= type_idx < n_tasks:
                                 task["type"] = TASK_TYPES[type_idx]
                                 break
-                            print(f"Please enter a number between 1 and {len(TASK_TYPES)}")
+                            print(f"Please enter a number between 1 and {n_tasks}")
                         except ValueError:
                             print("Please enter a valid number")
                     
@@ -193,23 +304,23 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
                     
                     annotated_turn["tasks"].append(task)
                 
-                # Get error type
-                while True:
+                # Get error type, unless it was given in the turn spec
+                while error_idx is None:
                     try:
-                        print("\nError types:")
-                        for k, error_type in enumerate(ERROR_TYPES, 0):
-                            print(f"  {k}. {error_type if error_type else 'None'}")
+                        write(ERROR_MENU)
                         
-                        error_idx = input(f"Error type (0-{len(ERROR_TYPES)-1}) [0]: ")
+                        error_idx = input(f"Error type (0-{n_errors-1}) [0]: ")
                         error_idx = int(error_idx) if error_idx.strip() else 0
-                        if 0 <= error_idx < len(ERROR_TYPES):
-                            error_type = ERROR_TYPES[error_idx]
-                            if error_type:
-                                annotated_turn["error_type"] = error_type
-                            break
-                        print(f"Please enter a number between 0 and {len(ERROR_TYPES)-1}")
+                        if not 0 <= error_idx < n_errors:
+                            print(f"Please enter a number between 0 and {n_errors-1}")
+                            error_idx = None
                     except ValueError:
                         print("Please enter a valid number")
+                        error_idx = None
+                
+                error_type = ERROR_TYPES[error_idx]
+                if error_type:
+                    annotated_turn["error_type"] = error_type
             
             annotated_dialogue["turns"].append(annotated_turn)
         
@@ -221,35 +332,35 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
         # Start with user turns and ask for bot turn corrections
         ground_truth = []
         for turn in annotated_dialogue["turns"]:
-            if turn.get("speaker") == "user":
+            if turn["speaker"] == "user":
                 # User turns stay the same
                 ground_truth.append({
-                    "id": f"gt_{turn['id']}",
+                    "id": turn["id"],
                     "speaker": "user",
-                    "text": turn.get("text", ""),
-                    "content": turn.get("content", "")
+                    "text": turn["text"],
+                    "content": turn["content"]
                 })
             else:
                 # For bot turns, ask if they need correction
                 print("\n" + "-"*30)
-                print(f"Bot turn: {turn.get('text', '')}")
+                print(f"Bot turn: {turn['text']}")
                 
                 while True:
                     needs_correction = input("Does this turn need correction in the ideal dialogue? (y/n) [n]: ").lower()
                     if needs_correction in ("", "n", "no"):
                         # Keep original
                         ground_truth.append({
-                            "id": f"gt_{turn['id']}",
+                            "id": turn["id"],
                             "speaker": "bot",
-                            "text": turn.get("text", ""),
-                            "content": turn.get("content", "")
+                            "text": turn["text"],
+                            "content": turn["content"]
                         })
                         break
                     elif needs_correction in ("y", "yes"):
                         # Get corrected text
                         corrected_text = input("Enter the ideal bot response: ")
                         ground_truth.append({
-                            "id": f"gt_{turn['id']}",
+                            "id": turn["id"],
                             "speaker": "bot",
                             "text": f"Bot: {corrected_text}",
                             "content": corrected_text
@@ -263,7 +374,7 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
         print("\nDialogue annotation complete!")
         
         # Ask if the user wants to continue with the next dialogue
-        if dialogue_idx < len(dialogues):
+        if dialogue_idx < n_dialogues:
             while True:
                 continue_annotation = input("Continue with next dialogue? (y/n) [y]: ").lower()
                 if continue_annotation in ("", "y", "yes"):
@@ -275,17 +386,65 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
     
     return annotated_dialogues
 
-def save_annotated_dialogues(dialogues: List[Dict[str, Any]], output_file: str) -> None:
+def _format_id(prefix: str, value: Any) -> str:
+    """Format an integer id with its prefix, leaving string ids unchanged"""
+    return value if isinstance(value, str) else f"{prefix}{value}"
+
+def format_dialogue_ids(dialogue: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Format the integer turn and task ids of a dialogue as strings
+    
+    Turns and tasks are numbered with integers while annotating; the string
+    ids (turn_1, task_turn_1_1, gt_turn_1) are only built for the output.
+    
+    Args:
+        dialogue: Annotated dialogue
+    
+    Returns:
+        Copy of the dialogue with string ids
+    """
+    formatted = dict(dialogue)
+    
+    turns = []
+    for turn in dialogue.get("turns", []):
+        turn_id = _format_id("turn_", turn["id"])
+        turn = dict(turn, id=turn_id)
+        if "tasks" in turn:
+            turn["tasks"] = [dict(task, id=_format_id(f"task_{turn_id}_", task["id"])) for task in turn["tasks"]]
+        turns.append(turn)
+    formatted["turns"] = turns
+    
+    if "ground_truth_turns" in dialogue:
+        formatted["ground_truth_turns"] = [
+            dict(turn, id=_format_id("gt_turn_", turn["id"]))
+            for turn in dialogue["ground_truth_turns"]
+        ]
+    
+    return formatted
+
+def save_annotated_dialogues(dialogues: List[Dict[str, Any]], output_file: str, pretty: bool = False) -> None:
     """
     Save annotated dialogues to a JSON file
     
     Args:
         dialogues: List of annotated dialogues
         output_file: Path to save the annotated dialogues
+        pretty: Indent the JSON for human inspection (compact by default)
     """
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({"dialogues": dialogues}, f, indent=2)
+        with open(output_file, 'wb', buffering=1 << 18) as f:
+            if pretty:
+                formatted = [format_dialogue_ids(dialogue) for dialogue in dialogues]
+                f.write(dumps_pretty({"dialogues": formatted}))
+            else:
+                # Encode one dialogue at a time, so only one dialogue's JSON
+                # is held in memory
+                f.write(b'{"dialogues":[')
+                for i, dialogue in enumerate(dialogues):
+                    if i:
+                        f.write(b',')
+                    f.write(dumps_compact(format_dialogue_ids(dialogue)))
+                f.write(b']}')
         logger.info(f"Saved {len(dialogues)} annotated dialogues to {output_file}")
     except Exception as e:
         logger.error(f"Failed to save annotated dialogues to {output_file}: {e}")
@@ -313,12 +472,14 @@ def create_sample_raw_dialogues(output_file: str, num_dialogues: int = 2) -> Non
         ]
     ]
     
+    parts = []
+    for i, dialogue in enumerate(sample_dialogues[:num_dialogues], 1):
+        parts.extend(turn + "\n" for turn in dialogue)
+        if i < num_dialogues:
+            parts.append("\n")  # Blank line between dialogues
+    
     with open(output_file, 'w', encoding='utf-8') as f:
-        for i, dialogue in enumerate(sample_dialogues[:num_dialogues], 1):
-            for turn in dialogue:
-                f.write(f"{turn}\n")
-            if i < num_dialogues:
-                f.write("\n")  # Blank line between dialogues
+        f.write("".join(parts))
     
     logger.info(f"Created sample raw dialogues file with {num_dialogues} dialogues at {output_file}")
 
@@ -326,6 +487,7 @@ def main():
     parser = argparse.ArgumentParser(description="Annotate dialogues for ontology pipeline evaluation")
     parser.add_argument("--input", help="Path to raw dialogues file")
     parser.add_argument("--output", default="annotated_dialogues.json", help="Path to save annotated dialogues")
+    parser.add_argument("--pretty", action="store_true", help="Indent the annotated dialogues JSON")
     parser.add_argument("--create-sample", action="store_true", help="Create a sample raw dialogues file")
     parser.add_argument("--sample-output", default="sample_raw_dialogues.txt", help="Path to save sample raw dialogues")
     parser.add_argument("--sample-size", type=int, default=2, help="Number of sample dialogues to create")
@@ -345,7 +507,7 @@ def main():
         return
     
     annotated_dialogues = annotate_dialogues_interactive(raw_dialogues)
-    save_annotated_dialogues(annotated_dialogues, args.output)
+    save_annotated_dialogues(annotated_dialogues, args.output, pretty=args.pretty)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -6,68 +6,277 @@ Combine multiple Rasa NLU files while preserving the correct YAML format
 import yaml
 import sys
 import os
+import re
+import mmap
+import pickle
+import glob
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Use the libyaml C loader and dumper when available
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# Minimum number of input files for parsing them in parallel processes
+PARALLEL_MIN_FILES = 4
+
+# User directory for parsed NLU files, reused while a file is unchanged
+NLU_CACHE_DIR = os.path.expanduser("~/.cache/combine_nlu")
+
+class RasaDumper(SafeDumper):
+    """YAML dumper writing multiline strings (examples) as literal blocks, as Rasa expects"""
+
+def represent_str(dumper, data):
+    """Represent strings containing line breaks in literal block style"""
+    style = '|' if '\n' in data else None
+    return dumper.represent_scalar('tag:yaml.org,2002:str', data, style=style)
+
+RasaDumper.add_representer(str, represent_str)
 
 def load_nlu_file(file_path):
     """Load NLU data from a YAML file"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f)
+    with open(file_path, 'rb') as f:
+        try:
+            # Parse straight from the page cache instead of copying the file
+            # through buffered reads
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return yaml.load(f, Loader=SafeLoader)
+        with mm:
+            data = yaml.load(mm, Loader=SafeLoader)
     return data
 
-def combine_nlu_files(output_file, *input_files):
-    """Combine multiple NLU files and write to output file"""
-    combined_nlu = []
+def load_nlu_file_cached(file_path):
+    """
+    Load NLU data from a YAML file, reusing the parsed data of earlier runs
+    
+    Cache files are named after the absolute file path and its modification
+    time and size, so a changed file is parsed again and replaces the
+    entries cached for its earlier versions.
+    """
+    stat = os.stat(file_path)
+    path_key = hashlib.blake2b(os.path.abspath(file_path).encode('utf-8'), digest_size=16).hexdigest()
+    state_key = hashlib.blake2b(f"{stat.st_mtime_ns}:{stat.st_size}".encode('utf-8'), digest_size=8).hexdigest()
+    cache_file = os.path.join(NLU_CACHE_DIR, f"{path_key}-{state_key}.pickle")
+    
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    
+    data = load_nlu_file(file_path)
+    
+    try:
+        os.makedirs(NLU_CACHE_DIR, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+        
+        # Drop the entries of earlier versions of the same file
+        for stale_file in glob.glob(os.path.join(NLU_CACHE_DIR, f"{path_key}-*.pickle")):
+            if stale_file != cache_file:
+                os.remove(stale_file)
+    except OSError as e:
+        print(f"Warning: Could not cache parsed {file_path}: {e}")
+    
+    return data
+
+# Header of NLU files whose intents can be copied without parsing: optional
+# comments and blank lines, the version line and the nlu key
+NLU_HEADER_RE = re.compile(rb'\A(?:[ \t]*(?:#[^\n]*)?\n)*version:[ \t]*["\']3\.1["\'][ \t]*\n(?:[ \t]*\n)*nlu:[ \t]*\n')
+# Any line starting another top-level key
+TOP_LEVEL_KEY_RE = re.compile(rb'^[^\s#-]', re.MULTILINE)
+# Indentation of the first list item
+ITEM_INDENT_RE = re.compile(rb'^([ ]*)-', re.MULTILINE)
+# An intent entry
+INTENT_LINE_RE = re.compile(rb'^[ ]*- intent:', re.MULTILINE)
+
+def read_nlu_block(file_path):
+    """
+    Read the raw intent list of an NLU file with the standard header
+    
+    Returns:
+        Bytes following the 'nlu:' line, or None if the file has another
+        layout and must be parsed
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return None
+        with mm:
+            match = NLU_HEADER_RE.match(mm)
+            if not match:
+                return None
+            block = mm[match.end():]
+    
+    if TOP_LEVEL_KEY_RE.search(block):
+        return None
+    return block
+
+def combine_nlu_blocks(output_file, *input_files):
+    """
+    Combine NLU files by copying their intent lists verbatim
+    
+    Only possible if every file has the standard header, contains nothing
+    but the nlu list and indents its list items the same way.
+    
+    Returns:
+        True if the output file was written, False if the files must be
+        combined by parsing them
+    """
+    blocks = []
+    indent = None
     
-    # Process each input file
     for file_path in input_files:
         if not os.path.exists(file_path):
             print(f"Warning: File {file_path} does not exist. Skipping.")
             continue
-            
+        
         print(f"Loading {file_path}...")
-        data = load_nlu_file(file_path)
+        block = read_nlu_block(file_path)
+        if block is None:
+            print(f"{file_path} cannot be copied verbatim, parsing all files instead.")
+            return False
         
+        item = ITEM_INDENT_RE.search(block)
+        if item is None:
+            continue
+        if indent is None:
+            indent = item.group(1)
+        elif item.group(1) != indent:
+            print(f"{file_path} is indented differently, parsing all files instead.")
+            return False
+        
+        if not block.endswith(b'\n'):
+            block += b'\n'
+        blocks.append(block)
+    
+    with open(output_file, 'wb') as f:
+        f.write(b'version: "3.1"\n\nnlu:\n')
+        f.writelines(blocks)
+    
+    print(f"Successfully combined {len(input_files)} NLU files into {output_file}")
+    print(f"Total intents: {sum(len(INTENT_LINE_RE.findall(block)) for block in blocks)}")
+    return True
+
+def dedupe_examples(examples, seen):
+    """
+    Remove examples that were already seen for the same intent
+    
+    Args:
+        examples: Examples string of an intent ("- example" lines)
+        seen: Set of example lines already added for the intent, updated
+            with the new ones
+    
+    Returns:
+        Examples string with only the new examples
+    """
+    new_lines = []
+    for line in examples.splitlines():
+        example = line.strip()
+        if not example or example in seen:
+            continue
+        seen.add(example)
+        new_lines.append(line)
+    return "\n".join(new_lines) + "\n" if new_lines else ""
+
+def combine_nlu_files(output_file, *input_files, fast=False, use_cache=True):
+    """
+    Combine multiple NLU files and write to output file
+    
+    Entries of the same intent are merged into one, and examples repeated
+    for the same intent are written only once. With
+    fast=True the intent lists are copied verbatim (without removing
+    duplicates) when all files have the standard layout, instead of being
+    parsed and dumped again. With use_cache=False the files are always
+    parsed instead of reusing the parsed data cached in NLU_CACHE_DIR.
+    """
+    if fast and combine_nlu_blocks(output_file, *input_files):
+        return
+    
+    # Entries by intent name (in first-seen order); entries without an intent
+    # name are kept as they are under a positional key
+    combined_nlu = {}
+    seen_examples = {}
+    duplicates = 0
+    
+    existing_files = []
+    for file_path in input_files:
+        if not os.path.exists(file_path):
+            print(f"Warning: File {file_path} does not exist. Skipping.")
+            continue
+        print(f"Loading {file_path}...")
+        existing_files.append(file_path)
+    
+    # The files are independent, so many of them are parsed in parallel;
+    # results come back in input order either way
+    load = load_nlu_file_cached if use_cache else load_nlu_file
+    if len(existing_files) >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor() as executor:
+            loaded = list(executor.map(load, existing_files))
+    else:
+        loaded = map(load, existing_files)
+    
+    # Process each input file
+    for file_path, data in zip(existing_files, loaded):
         if 'nlu' not in data:
             print(f"Warning: No 'nlu' key found in {file_path}. Skipping.")
             continue
             
-        # Add all intents to combined list
+        # Add all intents to combined list, merging entries of the same
+        # intent and dropping repeated examples
         for intent_data in data['nlu']:
-            combined_nlu.append(intent_data)
+            name = intent_data.get('intent')
+            examples = intent_data.get('examples')
+            if name is None or not isinstance(examples, str):
+                combined_nlu[name if name is not None else ('entry', len(combined_nlu))] = intent_data
+                continue
+            
+            seen = seen_examples.setdefault(name, set())
+            before = len(seen)
+            examples = dedupe_examples(examples, seen)
+            duplicates += sum(1 for line in intent_data['examples'].splitlines() if line.strip()) - (len(seen) - before)
+            
+            existing = combined_nlu.get(name)
+            if existing is None:
+                intent_data['examples'] = examples
+                combined_nlu[name] = intent_data
+            elif examples:
+                existing['examples'] = (existing.get('examples') or "") + examples
     
     # Create combined structure
     combined_data = {
         'version': '3.1',
-        'nlu': combined_nlu
+        'nlu': list(combined_nlu.values())
     }
     
-    # Custom YAML dumper to preserve the format Rasa expects
-    class LiteralString(str):
-        pass
-
-    def literal_presenter(dumper, data):
-        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
-
-    # Register the presenter for multiline strings
-    yaml.add_representer(LiteralString, literal_presenter)
-    
-    # Convert example strings to LiteralString to ensure correct formatting
-    for intent in combined_data['nlu']:
-        if 'examples' in intent and isinstance(intent['examples'], str):
-            intent['examples'] = LiteralString(intent['examples'])
-    
     # Write to output file
     with open(output_file, 'w', encoding='utf-8') as f:
-        yaml.dump(combined_data, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
+        yaml.dump(combined_data, f, Dumper=RasaDumper, default_flow_style=False, allow_unicode=True, sort_keys=False)
     
     print(f"Successfully combined {len(input_files)} NLU files into {output_file}")
     print(f"Total intents: {len(combined_nlu)}")
+    if duplicates:
+        print(f"Removed {duplicates} duplicate examples")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python combine_nlu.py output.yml input1.yml input2.yml [input3.yml ...]")
+    flags = {"--fast", "--no-cache"}
+    args = [arg for arg in sys.argv[1:] if arg not in flags]
+    fast = "--fast" in sys.argv[1:]
+    use_cache = "--no-cache" not in sys.argv[1:]
+    
+    if len(args) < 2:
+        print("Usage: python combine_nlu.py [--fast] [--no-cache] output.yml input1.yml input2.yml [input3.yml ...]")
         sys.exit(1)
     
-    output_file = sys.argv[1]
-    input_files = sys.argv[2:]
+    output_file = args[0]
+    input_files = args[1:]
     
-    combine_nlu_files(output_file, *input_files) 
\ No newline at end of file
+    combine_nlu_files(output_file, *input_files, fast=fast, use_cache=use_cache) 
\ No newline at end of file
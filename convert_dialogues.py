@@ -9,11 +9,11 @@ to annotate dialogues with task information and error types.
 
 import os
 import sys
-import json
+import random
 import logging
 import argparse
 from typing import Dict, List, Any
-import re
+from json_utils import dumps_pretty
 
 # Configure logging
 logging.basicConfig(
@@ -34,6 +34,12 @@ TASK_TYPES = [
 # Define error types
 ERROR_TYPES = [None, "substitution", "deletion", "insertion"]
 
+# Number of sample dialogues buffered before each write
+SAMPLE_FLUSH_EVERY = 1000
+
+# Prefixes of the turn lines in a raw dialogue file
+TURN_PREFIXES = ("User:", "Bot:")
+
 def load_raw_dialogues(input_file: str) -> List[Dict[str, Any]]:
     """
     Load raw dialogues from a text file
@@ -46,40 +52,43 @@ def load_raw_dialogues(input_file: str) -> List[Dict[str, Any]]:
     """
     dialogues = []
     current_dialogue = None
+    # Turns of the current dialogue and their bound append method
+    turns = []
+    turns_append = turns.append
     
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
         # Simple parsing logic - assumes dialogues are separated by blank lines
         # and turns are in format "User: ..." or "Bot: ..."
-        for line in lines:
-            line = line.strip()
-            
-            if not line:
-                # End of dialogue
-                if current_dialogue and current_dialogue.get("turns"):
-                    dialogues.append(current_dialogue)
-                current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": []}
-                continue
-            
-            if not current_dialogue:
-                current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": []}
-            
-            # Check if line starts with User: or Bot:
-            match = re.match(r"(User|Bot):\s*(.*)", line)
-            if match:
-                speaker, text = match.groups()
-                turn = {
-                    "id": f"turn_{len(current_dialogue['turns'])+1}",
-                    "speaker": speaker.lower(),
-                    "text": line,
-                    "content": text
-                }
-                current_dialogue["turns"].append(turn)
+        with open(input_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                
+                if not line:
+                    # End of dialogue
+                    if turns:
+                        dialogues.append(current_dialogue)
+                    turns = []
+                    turns_append = turns.append
+                    current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": turns}
+                    continue
+                
+                if not current_dialogue:
+                    current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": turns}
+                
+                # Check if line starts with User: or Bot:
+                if line.startswith(TURN_PREFIXES):
+                    speaker, _, text = line.partition(":")
+                    text = text.lstrip()
+                    turn = {
+                        "id": f"turn_{len(turns)+1}",
+                        "speaker": speaker.lower(),
+                        "text": line,
+                        "content": text
+                    }
+                    turns_append(turn)
         
         # Add the last dialogue if it exists
-        if current_dialogue and current_dialogue.get("turns"):
+        if turns:
             dialogues.append(current_dialogue)
         
         logger.info(f"Loaded {len(dialogues)} raw dialogues from {input_file}")
@@ -100,26 +109,25 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
         List of annotated dialogues
     """
     annotated_dialogues = []
+    num_task_types = len(TASK_TYPES)
+    num_error_types = len(ERROR_TYPES)
     
-    print("\n" + "="*50)
-    print("DIALOGUE ANNOTATION TOOL")
-    print("="*50)
-    print("\nTask types:")
-    for i, task_type in enumerate(TASK_TYPES, 1):
-        print(f"  {i}. {task_type}")
+    # Each block of output is collected and written with a single call
+    write = sys.stdout.write
     
-    print("\nError types:")
-    for i, error_type in enumerate(ERROR_TYPES, 0):
-        print(f"  {i}. {error_type if error_type else 'None'}")
+    lines = ["", "="*50, "DIALOGUE ANNOTATION TOOL", "="*50, "", "Task types:"]
+    lines.extend(f"  {i}. {task_type}" for i, task_type in enumerate(TASK_TYPES, 1))
+    lines.extend(["", "Error types:"])
+    lines.extend(f"  {i}. {error_type if error_type else 'None'}" for i, error_type in enumerate(ERROR_TYPES, 0))
+    write("\n".join(lines) + "\n")
     
     for dialogue in dialogues:
-        print("\n" + "="*50)
-        print(f"DIALOGUE: {dialogue['id']}")
-        print("="*50)
+        turns = dialogue.get("turns", [])
         
         # Print dialogue for reference
-        for i, turn in enumerate(dialogue.get("turns", []), 1):
-            print(f"{i}. {turn.get('text', '')}")
+        lines = ["", "="*50, f"DIALOGUE: {dialogue['id']}", "="*50]
+        lines.extend(f"{i}. {turn.get('text', '')}" for i, turn in enumerate(turns, 1))
+        write("\n".join(lines) + "\n")
         
         # Create a copy with annotated turns
         annotated_dialogue = {
@@ -129,20 +137,22 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
         }
         
         # Process each turn
-        for i, turn in enumerate(dialogue.get("turns", []), 1):
-            print("\n" + "-"*30)
-            print(f"Turn {i}: {turn.get('text', '')}")
+        for i, turn in enumerate(turns, 1):
+            text = turn.get("text", "")
+            speaker = turn.get("speaker", "")
+            
+            write(f"\n{'-'*30}\nTurn {i}: {text}\n")
             
             # Create annotated turn
             annotated_turn = {
                 "id": turn["id"],
-                "text": turn.get("text", ""),
-                "speaker": turn.get("speaker", ""),
+                "text": text,
+                "speaker": speaker,
                 "tasks": []
             }
             
             # Only ask for tasks and errors for bot turns
-            if turn.get("speaker") == "bot":
+            if speaker == "bot":
                 # Ask for tasks
                 while True:
                     try:
@@ -161,12 +171,12 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
                     # Get task type
                     while True:
                         try:
-                            type_idx = input(f"Task {j+1} type (1-{len(TASK_TYPES)}): ")
+                            type_idx = input(f"Task {j+1} type (1-{num_task_types}): ")
                             type_idx = int(type_idx) - 1
-                            if 0 <= type_idx < len(TASK_TYPES):
+                            if 0 <= type_idx < num_task_types:
                                 task["type"] = TASK_TYPES[type_idx]
                                 break
-                            print(f"Please enter a number between 1 and {len(TASK_TYPES)}")
+                            print(f"Please enter a number between 1 and {num_task_types}")
                         except ValueError:
                             print("Please enter a valid number")
                     
@@ -186,38 +196,41 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
                 # Get error type
                 while True:
                     try:
-                        error_idx = input(f"Error type (0-{len(ERROR_TYPES)-1}) [0]: ")
+                        error_idx = input(f"Error type (0-{num_error_types-1}) [0]: ")
                         error_idx = int(error_idx) if error_idx.strip() else 0
-                        if 0 <= error_idx < len(ERROR_TYPES):
+                        if 0 <= error_idx < num_error_types:
                             error_type = ERROR_TYPES[error_idx]
                             if error_type:
                                 annotated_turn["error_type"] = error_type
                             break
-                        print(f"Please enter a number between 0 and {len(ERROR_TYPES)-1}")
+                        print(f"Please enter a number between 0 and {num_error_types-1}")
                     except ValueError:
                         print("Please enter a valid number")
             
             annotated_dialogue["turns"].append(annotated_turn)
         
         # Ask for ground truth turns
-        print("\n" + "-"*30)
-        print("Now let's define the ground truth turns (ideal dialogue)")
-        print("For each bot turn, indicate if it should be different in the ideal case")
+        write(
+            "\n" + "-"*30 + "\n"
+            "Now let's define the ground truth turns (ideal dialogue)\n"
+            "For each bot turn, indicate if it should be different in the ideal case\n"
+        )
         
         # Start with user turns and ask for bot turn corrections
         ground_truth = []
         for turn in annotated_dialogue["turns"]:
-            if turn.get("speaker") == "user":
+            text = turn["text"]
+            
+            if turn["speaker"] == "user":
                 # User turns stay the same
                 ground_truth.append({
                     "id": f"gt_{turn['id']}",
-                    "text": turn.get("text", ""),
+                    "text": text,
                     "speaker": "user"
                 })
             else:
                 # For bot turns, ask if they need correction
-                print("\n" + "-"*30)
-                print(f"Bot turn: {turn.get('text', '')}")
+                write(f"\n{'-'*30}\nBot turn: {text}\n")
                 
                 while True:
                     needs_correction = input("Does this turn need correction in the ideal dialogue? (y/n) [n]: ").lower()
@@ -225,7 +238,7 @@ def annotate_dialogues_interactive(dialogues: List[Dict[str, Any]]) -> List[Dict
                         # Keep original
                         ground_truth.append({
                             "id": f"gt_{turn['id']}",
-                            "text": turn.get("text", ""),
+                            "text": text,
                             "speaker": "bot"
                         })
                         break
@@ -255,8 +268,8 @@ def save_annotated_dialogues(dialogues: List[Dict[str, Any]], output_file: str)
         dialogues: List of annotated dialogues
         output_file: Path to save the annotations
     """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(dialogues, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(dumps_pretty(dialogues))
     logger.info(f"Saved {len(dialogues)} annotated dialogues to {output_file}")
 
 def create_sample_raw_dialogues(output_file: str, num_dialogues: int = 3) -> None:
@@ -299,7 +312,8 @@ def create_sample_raw_dialogues(output_file: str, num_dialogues: int = 3) -> Non
         "displacement": ["register with local authorities", "contact humanitarian agencies", "secure clean water sources"]
     }
     
-    import random
+    # Dialogue text is buffered and written in chunks of SAMPLE_FLUSH_EVERY dialogues
+    parts = []
     
     with open(output_file, 'w', encoding='utf-8') as f:
         for i in range(num_dialogues):
@@ -307,18 +321,16 @@ def create_sample_raw_dialogues(output_file: str, num_dialogues: int = 3) -> Non
             
             # Create a dialogue with 2-5 turns
             num_turns = random.randint(2, 5)
-            f.write(f"# Dialogue {i+1}\n\n")
+            parts.append(f"# Dialogue {i+1}\n\n")
             
             for j in range(num_turns):
                 if j % 2 == 0:
                     # User turn
                     question = random.choice(user_questions).format(topic=topic)
-                    f.write(f"User: {question}\n")
+                    parts.append(f"User: {question}\n")
                 else:
                     # Bot turn
-                    guideline1 = random.choice(guidelines[topic])
-                    guideline2 = random.choice([g for g in guidelines[topic] if g != guideline1])
-                    guideline3 = random.choice([g for g in guidelines[topic] if g not in [guideline1, guideline2]])
+                    guideline1, guideline2, guideline3 = random.sample(guidelines[topic], 3)
                     
                     response = random.choice(bot_responses).format(
                         topic=topic,
@@ -326,10 +338,16 @@ def create_sample_raw_dialogues(output_file: str, num_dialogues: int = 3) -> Non
                         guideline2=guideline2,
                         guideline3=guideline3
                     )
-                    f.write(f"Bot: {response}\n")
+                    parts.append(f"Bot: {response}\n")
             
             # Add a blank line between dialogues
-            f.write("\n\n")
+            parts.append("\n\n")
+            
+            if (i + 1) % SAMPLE_FLUSH_EVERY == 0:
+                f.write("".join(parts))
+                parts.clear()
+        
+        f.write("".join(parts))
     
     logger.info(f"Created sample raw dialogues file with {num_dialogues} dialogues at {output_file}")
 
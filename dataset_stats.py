@@ -1,136 +1,130 @@
+import os
 import re
 import string
 from collections import Counter
+from heapq import nlargest
+from operator import itemgetter
+
+# Patterns used to extract the statistics
+NLU_INTENT_RE = re.compile(r'- intent: ([^\n]+)')
+ENTITY_REF_RE = re.compile(r'\[([^]]+)\]\(([^)]+)\)')
+
+# Translation table that removes punctuation from a string
+PUNCT_TRANSLATOR = str.maketrans('', '', string.punctuation)
 
 def extract_stats():
     """
     Extract statistics from domain.yml and nlu.yml files
     """
-    # Load files
-    with open('domain.yml', 'r', encoding='utf-8') as f:
-        domain_content = f.read()
-    
-    try:
-        with open('data/nlu.yml', 'r', encoding='utf-8') as f:
-            nlu_content = f.read()
-    except FileNotFoundError:
+    nlu_path = 'data/nlu.yml'
+    if not os.path.exists(nlu_path):
         # Try to open nlu.yml in the current directory
-        with open('nlu.yml', 'r', encoding='utf-8') as f:
-            nlu_content = f.read()
+        nlu_path = 'nlu.yml'
     
-    # Extract statistics using regex
+    # Walk domain.yml once, tracking the top-level section each line is in
+    intent_lines = []
+    entity_lines = []
+    response_templates = set()
+    utter_names = set()
+    section = None
     
-    # 1. Number of intents - find all lines that start with "- intent:" or are indented and start with "- "
-    intent_lines = re.findall(r'^\s*- (?!.*-)\s*([^\n]+)', domain_content, re.MULTILINE)
-    # Remove any non-intent lines (those that don't start with a letter)
-    intent_lines = [line for line in intent_lines if line and not line.startswith('action_')]
+    with open('domain.yml', 'r', encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            
+            # An unindented key such as "intents:" starts a new section
+            if not line[0].isspace() and not stripped.startswith('- '):
+                section = stripped.split(':', 1)[0]
+                continue
+            
+            if section == 'intents':
+                if stripped.startswith('- '):
+                    intent_lines.append(stripped[2:].strip())
+            elif section == 'entities':
+                if stripped.startswith('- '):
+                    entity_lines.append(stripped[2:].strip())
+            elif section == 'responses' and stripped.startswith('utter_'):
+                template_name = stripped.split(':')[0].strip()
+                utter_names.add(template_name)
+                # Lines that define a response template start with utter_ and have a colon
+                if ':' in stripped:
+                    response_templates.add(template_name)
+    
+    # 1. Number of intents listed in domain.yml
     num_intents = len(intent_lines)
     
-    # Alternative method: count all occurrences of "utter_" in domain.yml to identify intent responses
-    utter_patterns = re.findall(r'utter_[a-zA-Z0-9_]+', domain_content)
-    unique_utter_patterns = set(utter_patterns)
-    num_intents_alt = len(unique_utter_patterns)
-    
-    # Also count intents in nlu.yml for verification
-    nlu_intents = re.findall(r'- intent: ([^\n]+)', nlu_content)
-    num_nlu_intents = len(nlu_intents)
+    # Alternative method: count the utter_ names in the responses section
+    num_intents_alt = len(utter_names)
     
     # Use the higher count as the result
-    num_intents = max(num_intents, num_intents_alt, num_nlu_intents)
+    num_intents = max(num_intents, num_intents_alt)
     
-    # 2. Number of entities
-    # Find all entities in domain.yml 
-    entities_section = re.search(r'entities:(.*?)(?=^\w)', domain_content, re.DOTALL | re.MULTILINE)
-    num_entities = 0
-    if entities_section:
-        entities_lines = re.findall(r'^\s*- ([^\n]+)', entities_section.group(1), re.MULTILINE)
-        num_entities = len(entities_lines)
+    # 2. Number of entities listed in domain.yml
+    num_entities = len(entity_lines)
     
-    # Also check for entity references in nlu.yml
-    entity_refs = re.findall(r'\[([^]]+)\]\(([^)]+)\)', nlu_content)
-    unique_entities = set(entity_type for _, entity_type in entity_refs)
-    num_entities = max(num_entities, len(unique_entities))
-    
-    # 3. Number of responses - Using a simpler approach to count unique response templates
-    # Find all response template names in the file
-    response_templates = set()
-    domain_lines = domain_content.split('\n')
-    
-    # First find the responses section
-    start_line = 0
-    for i, line in enumerate(domain_lines):
-        if line.strip() == "responses:":
-            start_line = i
-            break
-    
-    # Collect all unique response templates
-    for i in range(start_line, len(domain_lines)):
-        line = domain_lines[i].strip()
-        
-        # Check if we've reached the end of the responses section
-        if line.startswith('entities:') or line.startswith('slots:') or line.startswith('actions:'):
-            break
-        
-        # Look for lines that define a response template (starts with utter_ and has a colon)
-        if line.startswith('utter_') and ':' in line:
-            template_name = line.split(':')[0].strip()
-            response_templates.add(template_name)
-    
-    # Count the unique response templates
+    # 3. Number of unique response templates
     response_count = len(response_templates)
     
     # 4. Process NLU data
     all_examples = []
-    all_text = ""
+    nlu_intents = []
+    entity_refs = []
     
-    # Extract examples directly from the content
-    # Looking for lines starting with "- " inside examples blocks
-    nlu_lines = nlu_content.split('\n')
+    # Stream nlu.yml once, collecting intents, entity references and
+    # examples (lines starting with "- " inside examples blocks)
     in_examples_block = False
     
-    for line in nlu_lines:
-        line = line.strip()
-        
-        if "examples: |" in line:
-            in_examples_block = True
-            continue
+    with open(nlu_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            nlu_intents.extend(NLU_INTENT_RE.findall(line))
+            entity_refs.extend(ENTITY_REF_RE.findall(line))
+            line = line.strip()
             
-        if in_examples_block:
-            if line.startswith('- '):  # This is an example line
-                example_text = line[2:].strip()  # Remove the "- " prefix
-                if example_text:  # Ignore empty lines
-                    all_examples.append(example_text)
-                    all_text += " " + example_text
-            elif line.startswith('- intent:') or not line:
-                # New intent block or empty line means end of examples
-                in_examples_block = False
+            if "examples: |" in line:
+                in_examples_block = True
+                continue
+                
+            if in_examples_block:
+                if line.startswith('- '):  # This is an example line
+                    example_text = line[2:].strip()  # Remove the "- " prefix
+                    if example_text:  # Ignore empty lines
+                        all_examples.append(example_text)
+                elif line.startswith('- intent:') or not line:
+                    # New intent block or empty line means end of examples
+                    in_examples_block = False
+    
+    # Also count intents in nlu.yml for verification
+    num_nlu_intents = len(nlu_intents)
+    num_intents = max(num_intents, num_nlu_intents)
+    
+    # Also check for entity references in nlu.yml
+    unique_entities = set(entity_type for _, entity_type in entity_refs)
+    num_entities = max(num_entities, len(unique_entities))
     
     # Number of questions/examples
     num_questions = len(all_examples)
     
-    # Clean text for tokenization
-    all_text = all_text.lower()
-    # Remove punctuation
-    translator = str.maketrans('', '', string.punctuation)
-    all_text = all_text.translate(translator)
+    # Lowercase, strip punctuation and count the tokens of each example in one pass
+    token_counter = Counter()
+    for example_text in all_examples:
+        token_counter.update(example_text.lower().translate(PUNCT_TRANSLATOR).split())
     
-    # Split into tokens and count
-    tokens = all_text.split()
-    num_tokens = len(tokens)
+    num_tokens = sum(token_counter.values())
     
     # Vocabulary size (unique tokens)
-    vocabulary_size = len(set(tokens))
+    vocabulary_size = len(token_counter)
     
     # Calculate average tokens per question
     avg_tokens_per_question = round(num_tokens / num_questions, 2) if num_questions > 0 else 0
     
-    # Calculate token frequency
-    token_counter = Counter(tokens)
-    most_common_tokens = token_counter.most_common(10)
+    # Most frequent tokens
+    most_common_tokens = nlargest(10, token_counter.items(), key=itemgetter(1))
     
     # Print debug info
-    print(f"Debug - Intents from regex: {len(intent_lines)}")
-    print(f"Debug - Intents from utter patterns: {len(unique_utter_patterns)}")
+    print(f"Debug - Intents from domain.yml: {len(intent_lines)}")
+    print(f"Debug - Intents from utter patterns: {num_intents_alt}")
     print(f"Debug - Intents from nlu.yml: {num_nlu_intents}")
     print(f"Debug - Using highest count: {num_intents}")
     
@@ -4,19 +4,30 @@ NLU Model Evaluation with 5-Fold Cross-Validation
 
 This script evaluates the NLU model's performance on intent recognition and entity extraction
 using 5-fold cross-validation to ensure a fair assessment despite limited data.
+
+Trained Rasa components are cached in $RASA_CACHE_DIRECTORY (default ~/.cache/rasa-cv),
+which persists between runs. Clear that directory only after changing the pipeline config.
 """
 
 import os
 import sys
-import json
+import asyncio
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import KFold
 import yaml
-import subprocess
 import tempfile
 import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from json_utils import loads, dumps_pretty
+
+# Use the libyaml C loader and dumper when available
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
 
 # Configure logging
 logging.basicConfig(
@@ -29,63 +40,100 @@ logger = logging.getLogger(__name__)
 # Force CPU-only execution
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
+# Metrics read from the Rasa reports, in report order
+METRIC_NAMES = ["precision", "recall", "f1-score", "support"]
+
+# Environment variable that sets where Rasa caches trained graph components
+RASA_CACHE_ENV = "RASA_CACHE_DIRECTORY"
+
+# Keep the Rasa cache in a stable user directory so repeated runs reuse it
+os.environ.setdefault(RASA_CACHE_ENV, os.path.expanduser("~/.cache/rasa-cv"))
+
+# Modules imported once in the forkserver process and shared by every fold worker
+FORKSERVER_PRELOAD = [
+    "rasa",
+    "rasa.model_training",
+    "rasa.model_testing",
+    "rasa.nlu.featurizers.dense_featurizer.lm_featurizer",
+]
+
 def load_nlu_data(nlu_file):
     """Load NLU data from YAML file"""
     with open(nlu_file, 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f)
+        data = yaml.load(f, Loader=SafeLoader)
     return data
 
-def split_nlu_data(data, train_indices, test_indices):
-    """Split NLU data into training and testing sets based on indices"""
-    train_data = {"version": data.get("version", "3.1"), "nlu": []}
-    test_data = {"version": data.get("version", "3.1"), "nlu": []}
-    
-    for idx, intent_data in enumerate(data.get("nlu", [])):
-        if idx in train_indices:
-            train_data["nlu"].append(intent_data)
-        elif idx in test_indices:
-            test_data["nlu"].append(intent_data)
-    
-    return train_data, test_data
+def serialize_nlu_data(data):
+    """
+    Serialize the NLU data to YAML once, one text block per intent
+    
+    Args:
+        data: Loaded NLU data
+        
+    Returns:
+        Tuple of (header, intent_yaml) where header holds the version and the
+        "nlu:" key and intent_yaml[i] is the list item for data["nlu"][i]
+    """
+    header = yaml.dump({"version": data.get("version", "3.1")}, Dumper=SafeDumper, allow_unicode=True, sort_keys=False) + "nlu:\n"
+    intent_yaml = [
+        yaml.dump([intent_data], Dumper=SafeDumper, allow_unicode=True, sort_keys=False)
+        for intent_data in data.get("nlu", [])
+    ]
+    return header, intent_yaml
+
+def split_nlu_data(header, intent_yaml, train_indices, test_indices):
+    """Split serialized NLU data into training and testing YAML texts based on indices"""
+    train_text = header + "".join(intent_yaml[idx] for idx in sorted(train_indices))
+    test_text = header + "".join(intent_yaml[idx] for idx in sorted(test_indices))
+    return train_text, test_text
 
-def write_yaml(data, file_path):
-    """Write data to YAML file"""
+def write_yaml(text, file_path):
+    """Write YAML text to file"""
     with open(file_path, 'w', encoding='utf-8') as f:
-        yaml.dump(data, f, allow_unicode=True, sort_keys=False)
+        f.write(text)
     logger.info(f"Wrote data to {file_path}")
 
-def run_rasa_train(config_file, train_file, output_dir):
-    """Train a Rasa model with the specified config and training data"""
-    model_name = f"nlu-model-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
-    command = [
-        "rasa", "train", "nlu",
-        "--config", config_file,
-        "--nlu", train_file,
-        "--out", output_dir,
-        "--fixed-model-name", model_name
-    ]
+def run_rasa_train(config_file, train_file, output_dir, model_name=None, cache_dir=None):
+    """
+    Train a Rasa model with the specified config and training data
+    
+    Components whose inputs are unchanged are loaded from the Rasa cache in
+    cache_dir (when given) instead of being retrained, so folds sharing a
+    cache only retrain what their split actually changes.
+    
+    Training runs in-process through Rasa's Python API, so Rasa is imported
+    once per worker process instead of once per `rasa` command.
+    """
+    from rasa.model_training import train_nlu
     
-    logger.info(f"Training model with command: {' '.join(command)}")
-    env = os.environ.copy()
-    env["CUDA_VISIBLE_DEVICES"] = "-1"
-    subprocess.run(command, check=True, env=env)
+    if model_name is None:
+        model_name = f"nlu-model-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
     
-    return os.path.join(output_dir, f"{model_name}.tar.gz")
+    logger.info(f"Training model {model_name} on {train_file}")
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+    if cache_dir:
+        os.environ[RASA_CACHE_ENV] = cache_dir
+    model_path = train_nlu(
+        config=config_file,
+        nlu_data=train_file,
+        output=output_dir,
+        fixed_model_name=model_name
+    )
+    
+    if not model_path:
+        raise RuntimeError(f"Rasa did not produce a model for {train_file}")
+    return model_path
 
-def run_rasa_test(model_path, test_file):
-    """Test a Rasa model on the test data and return the results directory"""
-    results_dir = tempfile.mkdtemp()
-    command = [
-        "rasa", "test", "nlu",
-        "--model", model_path,
-        "--nlu", test_file,
-        "--out", results_dir
-    ]
+def run_rasa_test(model_path, test_file, results_dir=None):
+    """Test a Rasa model on the test data in-process and return the results directory"""
+    from rasa.model_testing import test_nlu
     
-    logger.info(f"Testing model with command: {' '.join(command)}")
-    env = os.environ.copy()
-    env["CUDA_VISIBLE_DEVICES"] = "-1"
-    subprocess.run(command, check=True, env=env)
+    if results_dir is None:
+        results_dir = tempfile.mkdtemp()
+    
+    logger.info(f"Testing model {model_path} on {test_file}")
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+    asyncio.run(test_nlu(model=model_path, nlu_data=test_file, output_directory=results_dir))
     
     # Return the directory containing the results
     return results_dir
@@ -108,8 +156,8 @@ def extract_metrics(results_dir):
     entity_metrics = {}
     
     if os.path.exists(intent_report_path):
-        with open(intent_report_path, 'r') as f:
-            intent_report = json.load(f)
+        with open(intent_report_path, 'rb') as f:
+            intent_report = loads(f.read())
             
         # Log intent report structure for debugging - fix JSON serialization error
         logger.debug(f"Intent report keys: {list(intent_report.keys())}")
@@ -142,8 +190,8 @@ def extract_metrics(results_dir):
     
     # Read entity report
     if os.path.exists(entity_report_path):
-        with open(entity_report_path, 'r') as f:
-            entity_report = json.load(f)
+        with open(entity_report_path, 'rb') as f:
+            entity_report = loads(f.read())
             
         # Extract weighted average metrics for entities
         if "weighted avg" in entity_report:
@@ -173,66 +221,139 @@ def extract_metrics(results_dir):
     
     return intent_metrics, entity_metrics
 
-def run_cross_validation(nlu_file, config_file, n_splits=5):
-    """Run k-fold cross-validation for NLU model evaluation"""
+# Serialized NLU data (header, intent_yaml) of a cross-validation worker,
+# set once per process by init_fold_worker
+_worker_nlu_data = None
+
+def init_fold_worker(header, intent_yaml):
+    """
+    Prepare a cross-validation worker process
+    
+    Keeps the serialized NLU data for all the folds the worker runs, so it is
+    sent once per worker through the initializer instead of being pickled
+    with every fold. Rasa itself is already imported by the forkserver the
+    workers are started from (see FORKSERVER_PRELOAD).
+    
+    Args:
+        header: YAML header of the NLU data, from serialize_nlu_data
+        intent_yaml: Serialized intent blocks, from serialize_nlu_data
+    """
+    global _worker_nlu_data
+    _worker_nlu_data = (header, intent_yaml)
+    
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+def run_worker_fold(fold, train_idx, test_idx, config_file, temp_dir, cache_dir=None):
+    """Run a fold in a worker process on the NLU data set by init_fold_worker"""
+    header, intent_yaml = _worker_nlu_data
+    return run_fold(fold, train_idx, test_idx, header, intent_yaml, config_file, temp_dir, cache_dir)
+
+def run_fold(fold, train_idx, test_idx, header, intent_yaml, config_file, temp_dir, cache_dir=None):
+    """
+    Train and test a model on one cross-validation fold
+    
+    Args:
+        fold: Zero-based fold number
+        train_idx: Indices of the intent blocks used for training
+        test_idx: Indices of the intent blocks used for testing
+        header: YAML header of the NLU data, from serialize_nlu_data
+        intent_yaml: Serialized intent blocks, from serialize_nlu_data
+        config_file: Path to the Rasa config file
+        temp_dir: Working directory shared by all folds
+        cache_dir: Rasa component cache shared by all folds
+        
+    Returns:
+        Tuple of (fold, intent_metrics, entity_metrics)
+    """
+    logger.info(f"Starting fold {fold+1}")
+    
+    # Each fold gets its own models and results directories under the shared
+    # temp directory, and its own model name, so folds running at the same
+    # time do not overwrite each other
+    fold_dir = os.path.join(temp_dir, f"fold_{fold+1}")
+    models_dir = os.path.join(fold_dir, "models")
+    results_dir = os.path.join(fold_dir, "results")
+    os.makedirs(models_dir, exist_ok=True)
+    model_name = f"nlu-model-fold-{fold+1}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    
+    # Create train/test split
+    train_text, test_text = split_nlu_data(header, intent_yaml, train_idx, test_idx)
+    
+    # Write split files
+    train_file = os.path.join(temp_dir, f"train_fold_{fold+1}.yml")
+    test_file = os.path.join(temp_dir, f"test_fold_{fold+1}.yml")
+    write_yaml(train_text, train_file)
+    write_yaml(test_text, test_file)
+    
+    # Train model
+    model_path = run_rasa_train(config_file, train_file, models_dir, model_name, cache_dir)
+    
+    # Test model and get results directory
+    results_dir = run_rasa_test(model_path, test_file, results_dir)
+    
+    # Extract metrics from the results directory
+    intent_metrics, entity_metrics = extract_metrics(results_dir)
+    
+    logger.info(f"Fold {fold+1} intent metrics: {intent_metrics}")
+    logger.info(f"Fold {fold+1} entity metrics: {entity_metrics}")
+    
+    return fold, intent_metrics, entity_metrics
+
+def run_cross_validation(nlu_file, config_file, n_splits=5, max_workers=None):
+    """Run k-fold cross-validation for NLU model evaluation, training the folds in parallel"""
     # Load NLU data
     data = load_nlu_data(nlu_file)
     n_intents = len(data.get("nlu", []))
     
-    # Create temporary directories
+    # Serialize every intent block once; each fold only concatenates them
+    header, intent_yaml = serialize_nlu_data(data)
+    
+    # Create temporary directory; the Rasa component cache is shared by every fold and run
     temp_dir = tempfile.mkdtemp()
-    models_dir = os.path.join(temp_dir, "models")
-    os.makedirs(models_dir, exist_ok=True)
+    cache_dir = os.environ[RASA_CACHE_ENV]
+    os.makedirs(cache_dir, exist_ok=True)
     
     # Create indices for cross-validation
     kf = KFold(n_splits=n_splits, shuffle=True, random_state=42)
     all_indices = np.arange(n_intents)
     
-    # Initialize metrics storage
-    intent_metrics_list = []
-    entity_metrics_list = []
+    # Folds are independent, so train and test them in separate processes
+    if max_workers is None:
+        max_workers = n_splits
+    logger.info(f"Running {n_splits} folds with {max_workers} worker processes")
     
-    # Run cross-validation
-    for fold, (train_idx, test_idx) in enumerate(kf.split(all_indices)):
-        logger.info(f"Starting fold {fold+1}/{n_splits}")
-        
-        # Create train/test split
-        train_data, test_data = split_nlu_data(data, train_idx, test_idx)
-        
-        # Write split files
-        train_file = os.path.join(temp_dir, f"train_fold_{fold+1}.yml")
-        test_file = os.path.join(temp_dir, f"test_fold_{fold+1}.yml")
-        write_yaml(train_data, train_file)
-        write_yaml(test_data, test_file)
-        
-        # Train model
-        model_path = run_rasa_train(config_file, train_file, models_dir)
-        
-        # Test model and get results directory
-        results_dir = run_rasa_test(model_path, test_file)
-        
-        # Extract metrics from the results directory
-        intent_metrics, entity_metrics = extract_metrics(results_dir)
-        intent_metrics_list.append(intent_metrics)
-        entity_metrics_list.append(entity_metrics)
-        
-        logger.info(f"Fold {fold+1} intent metrics: {intent_metrics}")
-        logger.info(f"Fold {fold+1} entity metrics: {entity_metrics}")
-    
-    # Calculate average metrics
-    avg_intent_metrics = {
-        "precision": np.mean([m["precision"] for m in intent_metrics_list]),
-        "recall": np.mean([m["recall"] for m in intent_metrics_list]),
-        "f1-score": np.mean([m["f1-score"] for m in intent_metrics_list]),
-        "support": np.mean([m["support"] for m in intent_metrics_list])
-    }
+    # Fork the workers from a server that has already imported Rasa, where supported
+    if "forkserver" in mp.get_all_start_methods():
+        mp_context = mp.get_context("forkserver")
+        mp_context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    else:
+        mp_context = None
     
-    avg_entity_metrics = {
-        "precision": np.mean([m["precision"] for m in entity_metrics_list]),
-        "recall": np.mean([m["recall"] for m in entity_metrics_list]),
-        "f1-score": np.mean([m["f1-score"] for m in entity_metrics_list]),
-        "support": np.mean([m["support"] for m in entity_metrics_list])
-    }
+    fold_results = {}
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=init_fold_worker,
+        initargs=(header, intent_yaml)
+    ) as executor:
+        futures = [
+            executor.submit(run_worker_fold, fold, train_idx, test_idx, config_file, temp_dir, cache_dir)
+            for fold, (train_idx, test_idx) in enumerate(kf.split(all_indices))
+        ]
+        for future in as_completed(futures):
+            fold, intent_metrics, entity_metrics = future.result()
+            fold_results[fold] = (intent_metrics, entity_metrics)
+            logger.info(f"Finished fold {fold+1}/{n_splits}")
+    
+    # Keep the per-fold metrics in fold order
+    intent_metrics_list = [fold_results[fold][0] for fold in sorted(fold_results)]
+    entity_metrics_list = [fold_results[fold][1] for fold in sorted(fold_results)]
+    
+    # Calculate average metrics over a (folds x metrics) array
+    intent_arr = np.array([[m[name] for name in METRIC_NAMES] for m in intent_metrics_list], dtype=np.float64)
+    entity_arr = np.array([[m[name] for name in METRIC_NAMES] for m in entity_metrics_list], dtype=np.float64)
+    avg_intent_metrics = dict(zip(METRIC_NAMES, intent_arr.mean(axis=0)))
+    avg_entity_metrics = dict(zip(METRIC_NAMES, entity_arr.mean(axis=0)))
     
     # Create detailed report
     report = {
@@ -248,8 +369,8 @@ def run_cross_validation(nlu_file, config_file, n_splits=5):
     
     # Write report
     report_file = f"nlu_cv_evaluation_report_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
-    with open(report_file, 'w') as f:
-        json.dump(report, f, indent=2)
+    with open(report_file, 'wb') as f:
+        f.write(dumps_pretty(report))
     
     logger.info(f"Cross-validation complete. Report saved to {report_file}")
     
@@ -279,6 +400,7 @@ if __name__ == "__main__":
     parser.add_argument("--nlu", required=True, help="Path to NLU data file (YAML)")
     parser.add_argument("--config", required=True, help="Path to config file")
     parser.add_argument("--folds", type=int, default=5, help="Number of folds for cross-validation")
+    parser.add_argument("--workers", type=int, default=None, help="Number of folds to run in parallel (default: one per fold)")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
     
     args = parser.parse_args()
@@ -289,5 +411,7 @@ if __name__ == "__main__":
     
     # Log that we're using CPU-only mode
     logger.info("Running in CPU-only mode (CUDA_VISIBLE_DEVICES=-1)")
+    logger.info(f"Using YAML loader {SafeLoader.__name__}")
+    logger.info(f"Using Rasa cache directory {os.environ[RASA_CACHE_ENV]}")
     
-    run_cross_validation(args.nlu, args.config, args.folds) 
\ No newline at end of file
+    run_cross_validation(args.nlu, args.config, args.folds, args.workers) 
\ No newline at end of file
@@ -14,13 +14,24 @@ Usage:
 """
 
 import os
+import re
 import sys
-import json
 import argparse
 import logging
 import numpy as np
-from collections import defaultdict
-from typing import Dict, List, Any, Tuple
+import pandas as pd
+from typing import Dict, Any, Tuple, Iterator
+from json_utils import loads, dumps_pretty
+
+# Stream large dialogue files one dialogue at a time when ijson is installed
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# A turn in a raw dialogue file: speaker prefix and content
+TURN_LINE_RE = re.compile(r'^(User|Bot):\s*(.*)$')
+SPEAKERS = {"User": "user", "Bot": "bot"}
 
 # Configure logging
 logging.basicConfig(
@@ -40,8 +51,6 @@ class OntologyPipelineEvaluator:
         Args:
             dialogues_path: Path to the JSON file containing annotated dialogues
         """
-        self.dialogues = self._load_dialogues(dialogues_path)
-        
         # Define possible task types - customize these based on your ontology domain
         self.task_types = [
             "provide_information",
@@ -51,64 +60,123 @@ class OntologyPipelineEvaluator:
             "explain_relationship",
             "other"
         ]
+        # Small integer code of each task type, also used for fast membership checks
+        self._task_type_codes = {task_type: code for code, task_type in enumerate(self.task_types)}
         
-        self.metrics = {}
-    
-    def _load_dialogues(self, dialogues_path: str) -> List[Dict[str, Any]]:
-        """Load dialogues from JSON file"""
+        # Flat tables of tasks, turns and dialogues shared by all metrics,
+        # filled while the dialogues are streamed from the file
         try:
-            with open(dialogues_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Extract dialogues list from the JSON data
-            if isinstance(data, dict) and "dialogues" in data:
-                dialogues = data["dialogues"]
-            else:
-                dialogues = data  # Assume the entire JSON is the dialogues list
-                
-            logger.info(f"Loaded {len(dialogues)} dialogues from {dialogues_path}")
-            return dialogues
+            self.tasks_df, self.turns_df, self.dialogues_df = self._flatten_dialogues(
+                self._load_dialogues(dialogues_path)
+            )
+            logger.info(f"Loaded {len(self.dialogues_df)} dialogues from {dialogues_path}")
         except Exception as e:
             logger.error(f"Failed to load dialogues from {dialogues_path}: {e}")
-            return []
+            self.tasks_df, self.turns_df, self.dialogues_df = self._flatten_dialogues([])
+        
+        self.metrics = {}
     
-    def calculate_task_completion_rate(self) -> Dict[str, float]:
+    def _load_dialogues(self, dialogues_path: str) -> Iterator[Dict[str, Any]]:
         """
-        Calculate task completion rate for all dialogues
+        Load dialogues from JSON file, yielding them one at a time
+        
+        The file holds either {"dialogues": [...]} or the dialogues list itself.
+        With ijson only one dialogue is held in memory at a time; otherwise the
+        whole file is parsed at once.
+        """
+        with open(dialogues_path, 'rb') as f:
+            if ijson is None:
+                data = loads(f.read())
+                
+                # Extract dialogues list from the JSON data
+                if isinstance(data, dict) and "dialogues" in data:
+                    yield from data["dialogues"]
+                else:
+                    yield from data  # Assume the entire JSON is the dialogues list
+                return
+            
+            # Peek at the first character to tell a bare list from an object
+            head = f.read(64).lstrip()
+            f.seek(0)
+            prefix = "item" if head.startswith(b"[") else "dialogues.item"
+            yield from ijson.items(f, prefix, use_float=True)
+    
+    def _flatten_dialogues(self, dialogues: Iterator[Dict[str, Any]]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """
+        Flatten the dialogues into tables in a single pass
+        
+        Args:
+            dialogues: Iterable of annotated dialogues
         
         Returns:
-            Dictionary with task completion rates by task type and overall
+            Tuple of (tasks, turns, dialogues) DataFrames: one row per task of a
+            known type with its dialogue, turn index, id, type, type code, success
+            and the turn where the task first appeared; one row per turn with its
+            dialogue and error type; one row per dialogue with its number of
+            turns and ground truth turns
         """
-        task_success = defaultdict(int)
-        task_attempts = defaultdict(int)
+        task_type_codes = self._task_type_codes
+        task_rows = []
+        turn_rows = []
+        dialogue_rows = []
         
-        # Process each dialogue
-        for dialogue in self.dialogues:
-            # Extract tasks from dialogue
-            for turn in dialogue.get("turns", []):
-                if "tasks" not in turn:
-                    continue
+        for dialogue_idx, dialogue in enumerate(dialogues):
+            turns = dialogue.get("turns", [])
+            task_start_turn = {}
+            dialogue_rows.append((len(turns), len(dialogue.get("ground_truth_turns", []))))
+            
+            for turn_idx, turn in enumerate(turns):
+                turn_rows.append((dialogue_idx, turn.get("error_type")))
                 
                 for task in turn.get("tasks", []):
                     task_type = task.get("type")
-                    if task_type not in self.task_types:
+                    type_code = task_type_codes.get(task_type)
+                    if type_code is None:
                         continue
                     
-                    task_attempts[task_type] += 1
-                    task_attempts["overall"] += 1
-                    
-                    if task.get("success", False):
-                        task_success[task_type] += 1
-                        task_success["overall"] += 1
+                    task_id = task.get("id")
+                    start_turn = task_start_turn.setdefault((task_type, task_id), turn_idx)
+                    task_rows.append((
+                        dialogue_idx,
+                        turn_idx,
+                        task_id,
+                        task_type,
+                        type_code,
+                        bool(task.get("success", False)),
+                        start_turn
+                    ))
+        
+        tasks_df = pd.DataFrame(task_rows, columns=["dialogue", "turn", "task_id", "task_type", "type_code", "success", "start_turn"])
+        turns_df = pd.DataFrame(turn_rows, columns=["dialogue", "error_type"])
+        dialogues_df = pd.DataFrame(dialogue_rows, columns=["num_turns", "num_ground_truth"])
+        return tasks_df, turns_df, dialogues_df
+    
+    def calculate_task_completion_rate(self) -> Dict[str, float]:
+        """
+        Calculate task completion rate for all dialogues
+        
+        Returns:
+            Dictionary with task completion rates by task type and overall
+        """
+        # Count attempts and successes per task type code
+        codes = self.tasks_df["type_code"].to_numpy(dtype=np.int64)
+        successes = self.tasks_df["success"].to_numpy(dtype=bool)
+        task_attempts = np.bincount(codes, minlength=len(self.task_types))
+        task_success = np.bincount(codes, weights=successes, minlength=len(self.task_types))
         
         # Calculate completion rates
         completion_rates = {}
-        for task_type in self.task_types + ["overall"]:
-            if task_attempts[task_type] > 0:
-                completion_rates[task_type] = task_success[task_type] / task_attempts[task_type]
+        for code, task_type in enumerate(self.task_types):
+            if task_attempts[code] > 0:
+                completion_rates[task_type] = task_success[code] / task_attempts[code]
             else:
                 completion_rates[task_type] = 0.0
         
+        if len(codes) > 0:
+            completion_rates["overall"] = task_success.sum() / task_attempts.sum()
+        else:
+            completion_rates["overall"] = 0.0
+        
         logger.info(f"Task completion rates: {completion_rates}")
         self.metrics["task_completion_rate"] = completion_rates
         return completion_rates
@@ -117,53 +185,27 @@ class OntologyPipelineEvaluator:
         """
         Calculate task completion cost (average turns per task)
         
+        The cost of a task is the number of turns from the turn where it first
+        appears in a dialogue up to and including the first turn where it
+        succeeds. Tasks that never succeed are not counted.
+        
         Returns:
             Dictionary with task completion costs by task type and overall
         """
-        task_turns = defaultdict(list)
+        tasks = self.tasks_df
         
-        # Process each dialogue
-        for dialogue in self.dialogues:
-            # Track tasks and turns per task
-            task_turn_count = defaultdict(int)
-            active_tasks = defaultdict(set)
-            
-            for turn_idx, turn in enumerate(dialogue.get("turns", [])):
-                # Register new tasks that start in this turn
-                for task in turn.get("tasks", []):
-                    task_type = task.get("type")
-                    task_id = task.get("id")
-                    if task_type not in self.task_types:
-                        continue
-                    
-                    active_tasks[task_type].add(task_id)
-                    task_turn_count[(task_type, task_id)] = 1
-                
-                # Check for tasks that complete in this turn
-                for task in turn.get("tasks", []):
-                    task_type = task.get("type")
-                    task_id = task.get("id")
-                    if task_type not in self.task_types:
-                        continue
-                    
-                    if task.get("success", False) and task_id in active_tasks[task_type]:
-                        # Task completed successfully
-                        task_turns[task_type].append(task_turn_count[(task_type, task_id)])
-                        task_turns["overall"].append(task_turn_count[(task_type, task_id)])
-                        active_tasks[task_type].remove(task_id)
-                
-                # Increment turn count for active tasks
-                for task_type in self.task_types:
-                    for task_id in active_tasks[task_type]:
-                        task_turn_count[(task_type, task_id)] += 1
+        # First successful row of each task; its cost is a single subtraction
+        # from the start turn recorded when the task was first seen
+        completed = tasks.loc[tasks["success"].astype(bool)].drop_duplicates(["dialogue", "task_type", "task_id"])
+        turns_to_success = completed["turn"] - completed["start_turn"] + 1
+        task_types = completed["task_type"]
         
         # Calculate average turn counts
         completion_costs = {}
-        for task_type in self.task_types + ["overall"]:
-            if task_turns[task_type]:
-                completion_costs[task_type] = np.mean(task_turns[task_type])
-            else:
-                completion_costs[task_type] = 0.0
+        for task_type in self.task_types:
+            task_turns = turns_to_success[task_types == task_type]
+            completion_costs[task_type] = np.mean(task_turns) if len(task_turns) else 0.0
+        completion_costs["overall"] = np.mean(turns_to_success) if len(turns_to_success) else 0.0
         
         logger.info(f"Task completion costs: {completion_costs}")
         self.metrics["task_completion_cost"] = completion_costs
@@ -177,39 +219,28 @@ class OntologyPipelineEvaluator:
         Returns:
             Dictionary with edit distance metrics
         """
-        edit_distances = []
+        # Only dialogues with both actual and ground truth turns are scored
+        dialogues = self.dialogues_df[
+            (self.dialogues_df["num_turns"] > 0) & (self.dialogues_df["num_ground_truth"] > 0)
+        ]
         
-        for dialogue in self.dialogues:
-            # Get ground truth and actual dialogue turns
-            ground_truth = dialogue.get("ground_truth_turns", [])
-            actual = dialogue.get("turns", [])
-            
-            if not ground_truth or not actual:
-                continue
-            
-            # Count substitutions, deletions, and insertions
-            substitutions = 0
-            deletions = 0
-            insertions = 0
-            
-            for turn in actual:
-                if turn.get("error_type") == "substitution":
-                    substitutions += 1
-                elif turn.get("error_type") == "deletion":
-                    deletions += 1
-                elif turn.get("error_type") == "insertion":
-                    insertions += 1
-            
-            # Calculate error rate using the formula from the paper
-            if len(ground_truth) > 0:
-                error_rate = (substitutions + deletions + 0.4 * insertions) / len(ground_truth)
-                edit_distances.append(error_rate)
+        # Count substitutions, deletions, and insertions per dialogue
+        counts = (
+            self.turns_df.groupby("dialogue")["error_type"].value_counts().unstack(fill_value=0)
+            .reindex(index=dialogues.index, columns=["substitution", "deletion", "insertion"], fill_value=0)
+        )
+        
+        # Calculate error rate using the formula from the paper
+        edit_distances = (
+            (counts["substitution"] + counts["deletion"] + 0.4 * counts["insertion"])
+            / dialogues["num_ground_truth"]
+        ).to_numpy()
         
         edit_distance_metrics = {
-            "mean_edit_distance": np.mean(edit_distances) if edit_distances else 0.0,
-            "median_edit_distance": np.median(edit_distances) if edit_distances else 0.0,
-            "min_edit_distance": min(edit_distances) if edit_distances else 0.0,
-            "max_edit_distance": max(edit_distances) if edit_distances else 0.0
+            "mean_edit_distance": np.mean(edit_distances) if len(edit_distances) else 0.0,
+            "median_edit_distance": np.median(edit_distances) if len(edit_distances) else 0.0,
+            "min_edit_distance": edit_distances.min() if len(edit_distances) else 0.0,
+            "max_edit_distance": edit_distances.max() if len(edit_distances) else 0.0
         }
         
         logger.info(f"Edit distance metrics: {edit_distance_metrics}")
@@ -236,8 +267,8 @@ class OntologyPipelineEvaluator:
         Args:
             output_file: Path to save the metrics
         """
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metrics, f, indent=2)
+        with open(output_file, 'wb') as f:
+            f.write(dumps_pretty(self.metrics))
         logger.info(f"Saved metrics to {output_file}")
 
 def create_dialogue_annotation_template(output_path: str) -> None:
@@ -303,8 +334,8 @@ def create_dialogue_annotation_template(output_path: str) -> None:
         ]
     }
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(template, f, indent=2)
+    with open(output_path, 'wb') as f:
+        f.write(dumps_pretty(template))
     
     logger.info(f"Created dialogue annotation template at {output_path}")
 
@@ -320,44 +351,42 @@ def convert_raw_dialogues(input_file: str, output_file: str) -> None:
     current_dialogue = None
     
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
         # Simple parsing logic - assumes dialogues are separated by blank lines
         # and turns are in format "User: ..." or "Bot: ..."
-        for line in lines:
-            line = line.strip()
-            
-            if not line:
-                # End of dialogue
-                if current_dialogue and current_dialogue.get("turns"):
-                    dialogues.append(current_dialogue)
-                current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": []}
-                continue
-            
-            if not current_dialogue:
-                current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": []}
-            
-            # Check if line starts with User: or Bot:
-            if line.startswith("User:") or line.startswith("Bot:"):
-                speaker = "user" if line.startswith("User:") else "bot"
-                content = line[5:].strip() if speaker == "user" else line[4:].strip()
+        with open(input_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                
+                if not line:
+                    # End of dialogue
+                    if current_dialogue and current_dialogue.get("turns"):
+                        dialogues.append(current_dialogue)
+                    current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": []}
+                    continue
+                
+                if not current_dialogue:
+                    current_dialogue = {"id": f"dialogue_{len(dialogues)+1}", "turns": []}
                 
-                turn = {
-                    "id": f"turn_{len(current_dialogue['turns'])+1}",
-                    "speaker": speaker,
-                    "text": line,
-                    "content": content
-                }
-                current_dialogue["turns"].append(turn)
+                # Check if line starts with User: or Bot:
+                match = TURN_LINE_RE.match(line)
+                if match:
+                    speaker, content = match.groups()
+                    
+                    turn = {
+                        "id": f"turn_{len(current_dialogue['turns'])+1}",
+                        "speaker": SPEAKERS[speaker],
+                        "text": line,
+                        "content": content
+                    }
+                    current_dialogue["turns"].append(turn)
         
         # Add the last dialogue
         if current_dialogue and current_dialogue.get("turns"):
             dialogues.append(current_dialogue)
         
         # Save to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({"dialogues": dialogues}, f, indent=2)
+        with open(output_file, 'wb') as f:
+            f.write(dumps_pretty({"dialogues": dialogues}))
         
         logger.info(f"Converted {len(dialogues)} dialogues from {input_file} to {output_file}")
         
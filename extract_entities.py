@@ -21,13 +21,22 @@ def extract_entity_types():
     with open('domain.yml', 'r', encoding='utf-8') as f:
         domain_content = f.read()
     
-    # Extract the entities section from domain.yml
-    entities_section = re.search(r'entities:\s*(?:-\s*([^\n]+))*', domain_content)
+    # Extract the entities section from domain.yml: it runs from the
+    # "entities:" key to the next top-level key
     domain_entities = []
-    
-    if entities_section:
-        entities_text = entities_section.group(0)
-        domain_entities = re.findall(r'-\s*([a-z_]+)', entities_text)
+    start = domain_content.find('\nentities:')
+    
+    if start != -1:
+        end = len(domain_content)
+        for header in ('intents:', 'responses:', 'slots:', 'actions:', 'forms:', 'session_config:'):
+            pos = domain_content.find('\n' + header, start + 1)
+            if pos != -1 and pos < end:
+                end = pos
+        
+        for line in domain_content[start:end].splitlines():
+            line = line.strip()
+            if line.startswith('- '):
+                domain_entities.append(line[2:].strip())
     
     missing_entities = [e for e in unique_entities if e not in domain_entities]
     
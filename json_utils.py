@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+JSON helpers shared by the dialogue and evaluation scripts
+
+Uses orjson for faster parsing and writing when it is installed, and the
+standard json module otherwise. Encoded JSON is returned as UTF-8 bytes,
+so files are written in binary mode.
+"""
+
+import json
+from typing import Any
+
+# Faster JSON parsing and writing when orjson is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(data: bytes) -> Any:
+    """Decode UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_compact(obj: Any) -> bytes:
+    """Encode obj as compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def dumps_pretty(obj: Any) -> bytes:
+    """Encode obj as UTF-8 JSON indented by 2 spaces"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')